@@ -0,0 +1,152 @@
+"""
+Benchmark the time pytest-docgen adds to test collection, when it builds the doc collector tree.
+
+Generates a synthetic test tree for each size, collects it with ``--collect-only`` and times
+``pytest_collection_modifyitems`` with and without ``--rst-dir``. Per-item overhead should stay
+flat as the number of items grows::
+
+    python benchmarks/bench_collection.py --sizes 1000 10000 100000
+
+Use ``--modules 1 --classes 1 --functions 1`` to put every item under a single class.
+
+With docgen, the memory held by the doc collector of each test item (a leaf of the tree) is
+reported too, as the deep size of the collector after collection. Anything shared between
+leaves, such as the docstring of a parametrized test function, is counted once.
+
+Each size is run in its own interpreter, so imports of the generated tests don't pile up.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+from synthetic import generate_tree, params_for
+
+
+def deep_size(obj, seen):
+    """
+    Size of ``obj`` and everything it holds, skipping objects already in ``seen``.
+    """
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(x, seen) for x in obj)
+    else:
+        for name in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, name):
+                size += deep_size(getattr(obj, name), seen)
+        if hasattr(obj, "__dict__"):
+            size += deep_size(obj.__dict__, seen)
+    return size
+
+
+class CollectionTimer(object):
+    def __init__(self):
+        self.elapsed = 0.0
+        self.items = 0
+        self.leaf_bytes = None
+
+    @pytest.hookimpl(hookwrapper=True, tryfirst=True)
+    def pytest_collection_modifyitems(self, items):
+        # tryfirst makes this the outermost wrapper, so it includes docgen's work after its yield.
+        start = time.perf_counter()
+        yield
+        self.elapsed += time.perf_counter() - start
+        self.items = len(items)
+
+    def pytest_collection_finish(self, session):
+        leaves = [item._doccol for item in session.items if hasattr(item, "_doccol")]
+        if leaves:
+            seen = set()
+            self.leaf_bytes = sum(deep_size(leaf, seen) for leaf in leaves) / len(leaves)
+
+
+def run_one(root, rst_dir):
+    """
+    Collect the generated tests in ``root`` and print the timing as JSON.
+    """
+    timer = CollectionTimer()
+    args = ["--collect-only", "-q", "-p", "no:cacheprovider", root]
+    if rst_dir:
+        args.append("--rst-dir={}".format(rst_dir))
+    with open(os.devnull, "w") as devnull:
+        stdout = sys.stdout
+        sys.stdout = devnull
+        try:
+            pytest.main(args, plugins=[timer])
+        finally:
+            sys.stdout = stdout
+    print(
+        json.dumps({"items": timer.items, "elapsed": timer.elapsed, "leaf_bytes": timer.leaf_bytes})
+    )
+
+
+def measure(root, rst_dir=None):
+    cmd = [sys.executable, __file__, "--run-one", root]
+    if rst_dir:
+        cmd.extend(["--rst-dir", rst_dir])
+    output = subprocess.check_output(cmd, universal_newlines=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument(
+        "--modules",
+        type=int,
+        default=0,
+        help="Number of modules (default: enough for ten parametrizations of each test function)",
+    )
+    parser.add_argument("--classes", type=int, default=10, help="Classes per module")
+    parser.add_argument("--functions", type=int, default=10, help="Test functions per class")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    parser.add_argument("--rst-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        run_one(args.run_one, args.rst_dir)
+        return
+
+    print(
+        "{:>8}  {:>12}  {:>12}  {:>16}  {:>10}".format(
+            "items", "off (s)", "docgen (s)", "docgen/item (us)", "leaf (B)"
+        )
+    )
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as root:
+            tests = os.path.join(root, "tests")
+            os.mkdir(tests)
+            modules = args.modules or max(1, size // (args.classes * args.functions * 10))
+            generate_tree(
+                tests,
+                modules=modules,
+                classes=args.classes,
+                functions=args.functions,
+                params=params_for(size, modules, args.classes, args.functions),
+            )
+            off = measure(tests)
+            on = measure(tests, os.path.join(root, "_docs"))
+            overhead = on["elapsed"] - off["elapsed"]
+            print(
+                "{:>8}  {:>12.3f}  {:>12.3f}  {:>16.2f}  {:>10.0f}".format(
+                    on["items"],
+                    off["elapsed"],
+                    overhead,
+                    overhead / on["items"] * 1e6,
+                    on["leaf_bytes"],
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
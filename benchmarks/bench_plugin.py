@@ -0,0 +1,184 @@
+"""
+Benchmark what pytest-docgen costs a full test run.
+
+Generates a synthetic test tree, runs it with and without ``--rst-dir``, and reports wall time,
+peak memory, and the time spent in each phase docgen hooks into:
+
+* collection: ``pytest_collection_modifyitems``, where the doc collector tree is built
+* runtest: the runtest protocol of every test, where fixtures, results and logs are gathered
+* sessionfinish: ``pytest_sessionfinish``, where the documents are rendered and written
+
+For example::
+
+    python benchmarks/bench_plugin.py --modules 20 --classes 5 --functions 10 --fixtures 3 \\
+        --params 4 --stdout-lines 50 --log-lines 50
+
+Each configuration is run ``--repeat`` times, keeping the best of each measurement. Use ``--json``
+to save the results, e.g. to compare runs in CI.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+from synthetic import generate_tree
+
+PHASES = ["collection", "runtest", "sessionfinish"]
+
+
+class PhaseTimer(object):
+    """
+    Times the hooks docgen does its work in. Each timer is the outermost wrapper of its hook,
+    so it includes docgen's own wrappers and implementations.
+    """
+
+    def __init__(self):
+        self.elapsed = dict.fromkeys(PHASES, 0.0)
+        self.items = 0
+
+    @pytest.hookimpl(hookwrapper=True, tryfirst=True)
+    def pytest_collection_modifyitems(self, items):
+        start = time.perf_counter()
+        yield
+        self.elapsed["collection"] += time.perf_counter() - start
+        self.items = len(items)
+
+    @pytest.hookimpl(hookwrapper=True, tryfirst=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        start = time.perf_counter()
+        yield
+        self.elapsed["runtest"] += time.perf_counter() - start
+
+    @pytest.hookimpl(hookwrapper=True, tryfirst=True)
+    def pytest_sessionfinish(self, session):
+        start = time.perf_counter()
+        yield
+        self.elapsed["sessionfinish"] += time.perf_counter() - start
+
+
+def run_one(root, pytest_args):
+    """
+    Run the generated tests in ``root`` and print the measurements as JSON.
+    """
+    timer = PhaseTimer()
+    args = ["-q", "-p", "no:cacheprovider", "-o", "log_level=INFO", root] + pytest_args
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull:
+        stdout = sys.stdout
+        sys.stdout = devnull
+        try:
+            pytest.main(args, plugins=[timer])
+        finally:
+            sys.stdout = stdout
+    wall = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    print(
+        json.dumps({"items": timer.items, "wall": wall, "peak_kb": peak, "phases": timer.elapsed})
+    )
+
+
+def measure(root, pytest_args):
+    cmd = [sys.executable, __file__, "--run-one", root, "--"] + pytest_args
+    output = subprocess.check_output(cmd, universal_newlines=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def best_of(runs):
+    """
+    Combine repeated measurements, keeping the lowest value of each.
+    """
+    return {
+        "items": runs[0]["items"],
+        "wall": min(run["wall"] for run in runs),
+        "peak_kb": min(run["peak_kb"] for run in runs),
+        "phases": {phase: min(run["phases"][phase] for run in runs) for phase in PHASES},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0],
+        epilog="Arguments after -- are passed on to pytest, e.g. -- --rst-stream",
+    )
+    parser.add_argument("--modules", type=int, default=10, help="Number of test modules")
+    parser.add_argument("--classes", type=int, default=5, help="Test classes per module")
+    parser.add_argument("--functions", type=int, default=10, help="Test functions per class")
+    parser.add_argument("--fixtures", type=int, default=2, help="Fixtures per test")
+    parser.add_argument("--params", type=int, default=2, help="Parametrizations per function")
+    parser.add_argument("--stdout-lines", type=int, default=10, help="Lines printed per test")
+    parser.add_argument("--log-lines", type=int, default=10, help="Lines logged per test")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs of each, keeping the best (default: 3)"
+    )
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    parser.add_argument("pytest_args", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        run_one(args.run_one, args.pytest_args)
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        tests = os.path.join(root, "tests")
+        items = generate_tree(
+            tests,
+            modules=args.modules,
+            classes=args.classes,
+            functions=args.functions,
+            fixtures=args.fixtures,
+            params=args.params,
+            stdout_lines=args.stdout_lines,
+            log_lines=args.log_lines,
+        )
+        docgen_args = ["--rst-dir", os.path.join(root, "_docs"), "--rst-fixture-results"]
+        off_runs = []
+        on_runs = []
+        # Interleaved, so that both are affected the same by anything else going on.
+        for _ in range(args.repeat):
+            off_runs.append(measure(tests, args.pytest_args))
+            on_runs.append(measure(tests, docgen_args + args.pytest_args))
+        off = best_of(off_runs)
+        on = best_of(on_runs)
+
+    print("{} test items\n".format(items))
+    print("{:<16}  {:>12}  {:>12}  {:>12}".format("", "off", "docgen", "overhead"))
+    print(
+        "{:<16}  {:>12.3f}  {:>12.3f}  {:>12.3f}".format(
+            "wall (s)", off["wall"], on["wall"], on["wall"] - off["wall"]
+        )
+    )
+    for phase in PHASES:
+        print(
+            "{:<16}  {:>12.3f}  {:>12.3f}  {:>12.3f}".format(
+                phase + " (s)",
+                off["phases"][phase],
+                on["phases"][phase],
+                on["phases"][phase] - off["phases"][phase],
+            )
+        )
+    print(
+        "{:<16}  {:>12.1f}  {:>12.1f}  {:>12.1f}".format(
+            "peak rss (MB)",
+            off["peak_kb"] / 1024.0,
+            on["peak_kb"] / 1024.0,
+            (on["peak_kb"] - off["peak_kb"]) / 1024.0,
+        )
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"items": items, "off": off, "docgen": on, "args": vars(args)}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
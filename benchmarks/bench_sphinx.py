@@ -0,0 +1,178 @@
+"""
+Benchmark building pytest-docgen's documents with Sphinx, and its collapsible-block extension.
+
+Generates a synthetic test tree, runs it with ``--rst-dir``, then builds the documents with
+``sphinx-build -b html -j N`` for each of ``--jobs``, with and without
+``collapsible_block_lazy``. Reports the time of the read and write phases of each build, and
+checks that the HTML is the same whatever the number of jobs::
+
+    python benchmarks/bench_sphinx.py --modules 20 --classes 5 --functions 10 --jobs 1 2 4
+
+Use ``--sphinx`` to build with a Sphinx installed elsewhere, e.g.
+``--sphinx "/path/to/venv/bin/python -m sphinx"``; pytest_docgen is put on its ``PYTHONPATH``.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+
+from synthetic import generate_tree
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+CONF = """
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+extensions = ["pytest_docgen.sphinxext.collapsible_block", "bench_timer"]
+master_doc = "index"
+collapsible_block_lazy = {lazy}
+rst_epilog = '''
+.. |passed| replace:: passed
+.. |failed| replace:: failed
+'''
+"""
+
+# Records when each phase of the build starts and ends. These events all fire in the main
+# Sphinx process, with -j too.
+TIMER = """
+import json
+import os
+import time
+
+times = {}
+
+
+def mark(name):
+    def handler(app, *args):
+        times[name] = time.perf_counter()
+        if name == "end":
+            with open(os.environ["BENCH_TIMES"], "w") as f:
+                json.dump(times, f)
+
+    return handler
+
+
+def setup(app):
+    times["start"] = time.perf_counter()
+    app.connect("env-before-read-docs", mark("read"))
+    app.connect("env-updated", mark("write"))
+    app.connect("build-finished", mark("end"))
+    return {"parallel_read_safe": True, "parallel_write_safe": True}
+"""
+
+
+def html_digest(outdir):
+    """
+    Digest of every HTML file the build wrote, including the lazily loaded fragments.
+    """
+    digest = hashlib.sha1()
+    for dirpath, dirnames, filenames in sorted(os.walk(outdir)):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith(".html"):
+                filename = os.path.join(dirpath, name)
+                digest.update(os.path.relpath(filename, outdir).encode("utf-8"))
+                with open(filename, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+
+def build(sphinx, docs, outdir, jobs, lazy):
+    """
+    Build the documents from scratch, and return the time each phase took.
+    """
+    with open(os.path.join(docs, "conf.py"), "w") as f:
+        f.write(CONF.format(lazy=lazy))
+    times_file = os.path.join(os.path.dirname(outdir), "times.json")
+    env = dict(os.environ, BENCH_TIMES=times_file)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC, env.get("PYTHONPATH")]))
+    cmd = sphinx + ["-q", "-E", "-b", "html", "-j", str(jobs), docs, outdir]
+    subprocess.check_call(cmd, env=env, stderr=subprocess.DEVNULL)
+    with open(times_file) as f:
+        times = json.load(f)
+    return {
+        "read": times["write"] - times["read"],
+        "write": times["end"] - times["write"],
+        "total": times["end"] - times["start"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", type=int, default=10, help="Number of test modules")
+    parser.add_argument("--classes", type=int, default=5, help="Test classes per module")
+    parser.add_argument("--functions", type=int, default=10, help="Test functions per class")
+    parser.add_argument("--params", type=int, default=2, help="Parametrizations per function")
+    parser.add_argument("--stdout-lines", type=int, default=10, help="Lines printed per test")
+    parser.add_argument("--log-lines", type=int, default=10, help="Lines logged per test")
+    parser.add_argument(
+        "--jobs", nargs="+", type=int, default=[1, 2, 4], help="Values of sphinx-build -j"
+    )
+    parser.add_argument(
+        "--sphinx",
+        default="{} -m sphinx".format(shlex.quote(sys.executable)),
+        help="Command to run Sphinx with (default: python -m sphinx)",
+    )
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+    sphinx = shlex.split(args.sphinx)
+
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        tests = os.path.join(root, "tests")
+        docs = os.path.join(root, "_docs")
+        items = generate_tree(
+            tests,
+            modules=args.modules,
+            classes=args.classes,
+            functions=args.functions,
+            params=args.params,
+            stdout_lines=args.stdout_lines,
+            log_lines=args.log_lines,
+        )
+        subprocess.call(
+            [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", "-o"]
+            + ["log_level=INFO", tests, "--rst-dir", docs, "--rst-write-index"],
+            stdout=subprocess.DEVNULL,
+        )
+        with open(os.path.join(docs, "bench_timer.py"), "w") as f:
+            f.write(TIMER)
+
+        print("{} test items\n".format(items))
+        print(
+            "{:<6}  {:>4}  {:>10}  {:>10}  {:>10}  {:>9}".format(
+                "lazy", "-j", "read (s)", "write (s)", "total (s)", "same html"
+            )
+        )
+        for lazy in (False, True):
+            digests = set()
+            for jobs in args.jobs:
+                outdir = os.path.join(root, "_build", "{}-{}".format(lazy, jobs))
+                times = build(sphinx, docs, outdir, jobs, lazy)
+                digests.add(html_digest(outdir))
+                results.append(dict(times, lazy=lazy, jobs=jobs))
+                print(
+                    "{:<6}  {:>4}  {:>10.2f}  {:>10.2f}  {:>10.2f}  {:>9}".format(
+                        str(lazy),
+                        jobs,
+                        times["read"],
+                        times["write"],
+                        times["total"],
+                        "yes" if len(digests) == 1 else "NO",
+                    )
+                )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"items": items, "builds": results, "args": vars(args)}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Synthetic test trees for benchmarking pytest-docgen.
+"""
+import os
+
+TEST_MODULE = '''
+import logging
+
+import pytest
+
+log = logging.getLogger(__name__)
+
+
+@pytest.fixture(scope="module")
+def module_fixture():
+    """
+    Module fixture docs.
+    """
+    return "module"
+
+{fixtures}
+{tests}
+'''
+
+TEST_FIXTURE = '''
+@pytest.fixture
+def fixture_{index}():
+    """
+    Docs for fixture_{index}.
+    """
+    return {index}
+'''
+
+TEST_CLASS = '''
+class TestClass{index}:
+    """
+    Docs for TestClass{index}.
+    """
+{functions}
+'''
+
+TEST_FUNCTION = '''
+@pytest.mark.parametrize("param", range({params}))
+def test_{index}({args}):
+    """
+    Docs for test_{index}.
+    """
+    for line in range({stdout_lines}):
+        print("stdout line", line, "of test_{index}[", param, "]")
+    for line in range({log_lines}):
+        log.info("log line %d of test_{index}[%s]", line, param)
+'''
+
+
+def _indent(text, prefix="    "):
+    return "".join(prefix + line if line.strip() else line for line in text.splitlines(True))
+
+
+def params_for(items, modules, classes, functions):
+    """
+    Number of parametrizations each test function needs, for a tree of roughly ``items`` tests.
+    """
+    return max(1, items // (modules * max(classes, 1) * functions))
+
+
+def generate_tree(
+    root, modules=1, classes=1, functions=1, fixtures=0, params=1, stdout_lines=0, log_lines=0
+):
+    """
+    Write out a tree of test modules.
+
+    :param int modules: Number of test modules
+    :param int classes: Test classes per module. With 0, test functions are at module level.
+    :param int functions: Test functions per class (or module)
+    :param int fixtures: Function scoped fixtures requested by every test, on top of a module
+        scoped one.
+    :param int params: Parametrizations of each test function
+    :param int stdout_lines: Lines each test prints to stdout
+    :param int log_lines: Lines each test logs at INFO level
+    :return: Number of test items generated.
+    """
+    fixture_names = ["fixture_{}".format(index) for index in range(fixtures)]
+    test_fixtures = "".join(TEST_FIXTURE.format(index=index) for index in range(fixtures))
+
+    def test_functions(self_arg):
+        args = ", ".join(self_arg + ["module_fixture"] + fixture_names + ["param"])
+        return "".join(
+            TEST_FUNCTION.format(
+                index=index,
+                args=args,
+                params=params,
+                stdout_lines=stdout_lines,
+                log_lines=log_lines,
+            )
+            for index in range(functions)
+        )
+
+    if classes:
+        functions_in_class = _indent(test_functions(["self"]))
+        tests = "".join(
+            TEST_CLASS.format(index=index, functions=functions_in_class) for index in range(classes)
+        )
+    else:
+        tests = test_functions([])
+
+    os.makedirs(root, exist_ok=True)
+    for module in range(modules):
+        with open(os.path.join(root, "test_module_{}.py".format(module)), "w") as f:
+            f.write(TEST_MODULE.format(fixtures=test_fixtures, tests=tests))
+    return modules * max(classes, 1) * functions * params
@@ -25,4 +25,6 @@ setup(
         "Framework :: Pytest",
     ],
     install_requires=["rstcloth", "tabulate"],
+    # For the Sphinx extensions under pytest_docgen.sphinxext
+    extras_require={"sphinx": ["sphinx>=1.8"]},
 )
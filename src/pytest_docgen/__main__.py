@@ -0,0 +1,55 @@
+"""
+Command line interface of pytest-docgen.
+
+Render the RST documents of a run saved with ``--rst-store`` again, e.g. with another label prefix,
+without running its tests::
+
+    python -m pytest_docgen render _docs/results.jsonl --rst-label-prefix=nightly-
+"""
+import argparse
+import os
+import sys
+
+from pytest_docgen.pytest_docgen import (
+    DocgenSettings,
+    add_render_options,
+    find_result_store,
+    read_result_store_run_id,
+    render_result_store,
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m pytest_docgen")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    render = commands.add_parser(
+        "render", help="Render the RST documents from a result store, without running the tests"
+    )
+    render.add_argument(
+        "store",
+        help="Result store (results.jsonl or results.sqlite), or the directory holding it",
+    )
+    render.add_argument(
+        "--rst-dir",
+        dest="rst_dir",
+        help="Destination directory for the RST documents (default: the result store's directory)",
+    )
+    add_render_options(render.add_argument)
+    args = parser.parse_args(argv)
+    if args.command != "render":
+        parser.print_help()
+        return 2
+
+    try:
+        store = find_result_store(args.store)
+        args.rst_dir = args.rst_dir or os.path.dirname(store) or "."
+        args.rst_run_id = args.rst_run_id or read_result_store_run_id(store)
+        settings = DocgenSettings(lambda name, default=None: getattr(args, name, default))
+    except (IOError, ValueError) as exc:
+        parser.error(str(exc))
+    render_result_store(store, settings)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Compressed sidecar files for the captured logs of tests.
+
+A log store is a file of gzip members, one after another, one for each log added to it. The
+whole file is still a valid gzip file, of all of the logs, but each log can also be read on its
+own from its offset and length in the file, without decompressing anything before it. An index
+of where each test's logs are is kept alongside, as JSON.
+
+Only the standard library is used, so that the Sphinx extensions can read log stores without
+pytest.
+"""
+import gzip
+import hashlib
+import json
+import os
+from io import BytesIO
+
+
+def index_filename(filename):
+    """
+    Return the filename of the index of a log store, e.g. ``test_module.logs.json`` for
+    ``test_module.logs.gz``.
+    """
+    return os.path.splitext(filename)[0] + ".json"
+
+
+class LogStoreWriter(object):
+    """
+    Writes a log store, replacing any that was there.
+
+    :param bool append: Add to the log store that's there (and its index) instead.
+    """
+
+    def __init__(self, filename, compresslevel=6, append=False):
+        self.filename = filename
+        self.compresslevel = compresslevel
+        self.index = {}
+        self._digest = hashlib.sha1()
+        log_dir = os.path.dirname(filename)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        if append and os.path.exists(filename):
+            try:
+                self.index = read_index(filename)
+            except (IOError, ValueError):
+                pass
+            self._file = open(filename, "ab")
+        else:
+            self._file = open(filename, "wb")
+
+    def add(self, test_id, name, text):
+        """
+        Add a log to the store.
+
+        :param str test_id: ID of the test the log is from
+        :param str name: Name of the log within the test, e.g. the test phase
+        :param str text: The log
+        :return: (offset, length) of the compressed log in the file
+        :rtype: tuple
+        """
+        # A fixed mtime, so the same logs always make the same file.
+        buf = BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=self.compresslevel, mtime=0) as f:
+            f.write(text.encode("utf-8"))
+        data = buf.getvalue()
+        offset = self._file.tell()
+        self._file.write(data)
+        self._digest.update(data)
+        self.index.setdefault(test_id, {})[name] = [offset, len(data)]
+        return offset, len(data)
+
+    def close(self):
+        """
+        Close the store and write its index.
+
+        :return: The filename and digest of the store and of its index, or nothing if the store
+            was already closed.
+        :rtype: list
+        """
+        if self._file.closed:
+            return []
+        self._file.close()
+        index = json.dumps(self.index, indent=1, sort_keys=True)
+        with open(index_filename(self.filename), "w") as f:
+            f.write(index)
+        return [
+            (self.filename, self._digest.hexdigest()),
+            (index_filename(self.filename), hashlib.sha1(index.encode("utf-8")).hexdigest()),
+        ]
+
+
+def read_log(filename, offset, length):
+    """
+    Read one log back out of a log store.
+
+    :param int offset: Offset of the log in the file, as returned by :meth:`LogStoreWriter.add`
+    :param int length: Length of the compressed log
+    :rtype: str
+    """
+    with open(filename, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    return gzip.decompress(data).decode("utf-8")
+
+
+def read_index(filename):
+    """
+    Read the index of a log store: ``{test id: {log name: [offset, length]}}``.
+    """
+    with open(index_filename(filename), "r") as f:
+        return json.load(f)
@@ -5,14 +5,29 @@
  tests or just failed/skipped? not sure. I think all should be an option.
 
 """
+import ast
+import bisect
+import hashlib
+import io
+import itertools
+import json
+import math
 import os
-from collections import OrderedDict, namedtuple
-from distutils.version import LooseVersion
+import sys
+import time
+import tokenize
+from array import array
+from contextlib import contextmanager
+from functools import lru_cache
+from datetime import datetime
+from collections import Counter, OrderedDict, namedtuple
 
 import pytest
 import inspect
 
 import shutil
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 
 import re
 from _pytest.main import Session
@@ -21,8 +36,7 @@ from os import path
 
 from rstcloth.rstcloth import RstCloth
 
-# Todo: pytest 3.6+: get caplog some other way?
-PYTEST_NEW_CAPLOG = LooseVersion(pytest.__version__) > "5.0.0"
+from pytest_docgen.logstore import LogStoreWriter, index_filename
 
 try:
     from _pytest.python import Package
@@ -42,6 +56,14 @@ from tabulate import tabulate
 SESSION_HEADER_MAP = {"session": "h1", "module": "h2", "class": "h3", "function": "h4"}
 RESULTS_HEADER = ["Test Name", "Setup", "Call", "Teardown"]
 DEFAULT_BUILD_ORDER = ["fixtures", "results", "source", "logs"]
+# Outcome of a passed stage. Every passed result holds this one string.
+PASSED = "PASSED"
+BUILD_SECTION_NAMES = {
+    "fixtures": "_build_fixtures",
+    "results": "_build_results",
+    "source": "_build_source_link",
+    "logs": "_build_logs",
+}
 
 
 def _pop_top_dir(path):
@@ -75,7 +97,864 @@ def doc_prep(docstring):
     return indented_docs
 
 
+# Fixture functions whose prepared docs are kept. Any test suite has far fewer fixtures than this.
+FIXTURE_DOC_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=FIXTURE_DOC_CACHE_SIZE)
+def fixture_doc(func):
+    """
+    Prepare a fixture function's docstring, as the text written under the fixture's name.
+    Cached by function, as the same fixture is set up for test after test.
+
+    :param func: Fixture function
+    :rtype: str
+    """
+    return "\n".join(doc_prep(func.__doc__ or "empty docstring"))
+
+
+# Source files whose definitions are kept, for --rst-source-mode.
+SOURCE_CACHE_SIZE = 256
+SOURCE_MODES = ["pyobject", "lines", "inline"]
+
+
+@lru_cache(maxsize=SOURCE_CACHE_SIZE)
+def _read_source(filename, mtime):
+    """
+    Read a source file, and find where each function and class in it is. Cached by path and
+    modification time, so a file is only parsed once for all of its tests.
+
+    :return: The lines of the file, and the span of each definition (from its first decorator
+        to the end of its body, counted from 1) by dotted name, e.g. ``TestClass.test_one``.
+    """
+    try:
+        with tokenize.open(filename) as f:
+            text = f.read()
+        tree = ast.parse(text, filename)
+        # The last line of each logical line. ast nodes only know where they end from Python
+        # 3.8, so a definition ends on the last of these before whatever comes after it.
+        ends = [
+            token[2][0]
+            for token in tokenize.generate_tokens(io.StringIO(text).readline)
+            if token[0] == tokenize.NEWLINE
+        ]
+    except (IOError, SyntaxError, UnicodeDecodeError, tokenize.TokenError):
+        return [], {}
+    lines = text.splitlines()
+    spans = {}
+    bodies = [("", tree.body, len(lines) + 1)]
+    while bodies:
+        prefix, body, limit = bodies.pop()
+        starts = [_first_line(node) for node in body] + [limit]
+        for node, start, next_start in zip(body, starts, starts[1:]):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                end = ends[bisect.bisect_left(ends, next_start) - 1]
+                spans[prefix + node.name] = (start, end)
+                if isinstance(node, ast.ClassDef):
+                    bodies.append((prefix + node.name + ".", node.body, next_start))
+    return lines, spans
+
+
+def _first_line(node):
+    """
+    The line a statement starts on, counting its decorators.
+    """
+    return min(
+        [node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])]
+    )
+
+
+def source_span(filename, name):
+    """
+    Find the lines of a function or class in a source file.
+
+    :param str filename: Path to the source file
+    :param str name: Dotted name of the function or class within the file
+    :return: The first and last line of the definition, counted from 1, or None if it isn't
+        found.
+    """
+    try:
+        mtime = os.path.getmtime(filename)
+    except OSError:
+        return None
+    return _read_source(filename, mtime)[1].get(name)
+
+
+def source_lines(filename, span):
+    """
+    Return the lines of ``span`` in a source file, as found by :func:`source_span`.
+    """
+    try:
+        mtime = os.path.getmtime(filename)
+    except OSError:
+        return []
+    return _read_source(filename, mtime)[0][span[0] - 1 : span[1]]
+
+
+class DocgenProfile(object):
+    """
+    Timings of docgen's own work, for ``--rst-profile``. Every call is kept, so that
+    percentiles can be reported.
+    """
+
+    def __init__(self):
+        self.samples = {}
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, elapsed):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = array("d")
+        samples.append(elapsed)
+
+    def merge(self, samples):
+        """
+        Add in the samples of another profile, e.g. from a worker process.
+
+        :param dict samples: Lists of samples, keyed by name
+        """
+        for name, elapsed in samples.items():
+            for sample in elapsed:
+                self.add(name, sample)
+
+    def summary(self):
+        """
+        :return: calls, total, mean, p99 and max time (in seconds) of each timer, slowest first.
+        :rtype: list
+        """
+        rows = []
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            total = sum(ordered)
+            p99 = ordered[max(0, int(math.ceil(len(ordered) * 0.99)) - 1)]
+            rows.append(
+                {
+                    "name": name,
+                    "calls": len(ordered),
+                    "total": total,
+                    "mean": total / len(ordered),
+                    "p99": p99,
+                    "max": ordered[-1],
+                }
+            )
+        rows.sort(key=lambda row: row["total"], reverse=True)
+        return rows
+
+    def write(self, filename):
+        _write_text(filename, json.dumps(self.summary(), indent=2))
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+# Set while rendering documents with --rst-profile, so the render phases are timed.
+_render_profile = None
+# Set while rendering documents with --rst-log-mode=lazy, to write the logs to.
+_render_logs = None
+# Set while rendering documents whose captured output is in compressed log stores.
+_render_log_compress = False
+LOG_MODES = ["inline", "lazy"]
+
+
+def _timer(session, name):
+    """
+    Time a block of docgen work under ``name``, if profiling is enabled for the session.
+    """
+    profile = getattr(session, "doc_profile", None)
+    if profile is None:
+        return _NULL_TIMER
+    return profile.timer(name)
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _write_text(filename, text):
+    """
+    Write a rendered document out, the same way ``RstCloth.write`` does.
+    """
+    dirname = os.path.dirname(filename)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    with open(filename, "w") as f:
+        f.write(text)
+
+
+class DocManifest(object):
+    """
+    Content hashes of the files written into the RST directory, kept between runs so that a file
+    is only replaced when its content actually changes. Unchanged files keep their mtimes, so
+    Sphinx doesn't have to re-read them.
+    """
+
+    FILENAME = ".docgen-manifest.json"
+
+    def __init__(self, rst_dir):
+        self.rst_dir = rst_dir
+        self.filename = os.path.join(rst_dir, self.FILENAME)
+        try:
+            with open(self.filename, "r") as f:
+                self._previous = json.load(f)
+        except (IOError, ValueError):
+            self._previous = {}
+        self._current = {}
+
+    def _key(self, filename):
+        return os.path.relpath(filename, self.rst_dir).replace(os.path.sep, "/")
+
+    def previous(self, filename):
+        """
+        Return the digest ``filename`` was last written with, if it still exists.
+        """
+        if os.path.exists(filename):
+            return self._previous.get(self._key(filename))
+        return None
+
+    def previous_in(self, dirname):
+        """
+        Return the digests of the files last written in ``dirname`` that still exist, by filename.
+        """
+        prefix = self._key(dirname) + "/"
+        previous = {}
+        for key, digest in self._previous.items():
+            if key.startswith(prefix):
+                filename = os.path.join(self.rst_dir, *key.split("/"))
+                if os.path.exists(filename):
+                    previous[filename] = digest
+        return previous
+
+    def record(self, filename, digest):
+        self._current[self._key(filename)] = digest
+
+    def write_text(self, filename, text):
+        """
+        Write ``text`` to ``filename``, unless that is what it already contains.
+        """
+        digest = _digest(text)
+        if self.previous(filename) != digest:
+            _write_text(filename, text)
+        self.record(filename, digest)
+
+    def replace(self, src, dst, digest):
+        """
+        Move a freshly written file into place, unless the file it would replace has the
+        same content.
+        """
+        if self.previous(dst) == digest:
+            os.remove(src)
+        else:
+            os.replace(src, dst)
+        self.record(dst, digest)
+
+    def save(self):
+        """
+        Save the manifest. Captured output logs that weren't written this run are removed,
+        as they would have been by clearing out the log directory at the start of the run.
+        """
+        for key in set(self._previous) - set(self._current):
+            if key.startswith("logs/"):
+                stale = os.path.join(self.rst_dir, *key.split("/"))
+                if os.path.exists(stale):
+                    os.remove(stale)
+            else:
+                self._current.setdefault(key, self._previous[key])
+        _write_text(self.filename, json.dumps(self._current, indent=1, sort_keys=True))
+
+
+CAPTURE_HEADER = "{0} Captured stdout {0}\n".format("=" * 20)
+CAPTURE_FOOTER = "{0} End stdout {0}\n".format("=" * 20)
+
+
+class CaptureLog(object):
+    """
+    Append-only writer for a module's captured output log.
+
+    Keeps one open handle and a running count of the lines in the file, so the line range
+    of each appended capture is known without re-reading the file.
+
+    With a :class:`DocManifest`, the log is written to a temporary file alongside, and only
+    moved into place on close if its content changed.
+    """
+
+    def __init__(self, filename, manifest=None):
+        self.filename = filename
+        self.manifest = manifest
+        self.line_count = 0
+        log_dir = os.path.dirname(filename)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        if manifest is not None:
+            self._digest = hashlib.sha1()
+            self._log = open(filename + ".tmp", "w")
+            return
+        self._digest = None
+        if os.path.exists(filename):
+            # Only paid once per file, when appending to a log left over from elsewhere.
+            with open(filename, "r") as existing:
+                for chunk in iter(lambda: existing.read(65536), ""):
+                    self.line_count += chunk.count("\n")
+        self._log = open(filename, "a")
+
+    def _write(self, text):
+        self._log.write(text)
+        if self._digest is not None:
+            self._digest.update(text.encode("utf-8"))
+
+    def append(self, capstdout=None, capstderr=None, test_id=None):
+        """
+        Write captured output to the log.
+
+        :param str test_id: Not used here; see :meth:`CompressedCaptureLog.append`.
+        :return: (start, end) line numbers of the capture, as used by ``literalinclude :lines:``
+        :rtype: tuple
+        """
+        capture_start = self.line_count + 1
+        capture_end = capture_start
+        for captured in (capstdout, capstderr):
+            if not captured:
+                continue
+            newlines = captured.count("\n")
+            self._write(CAPTURE_HEADER)
+            self._write(captured)
+            self._write(CAPTURE_FOOTER)
+            self.line_count += newlines + 2
+            capture_end += newlines + 1
+        return capture_start, capture_end
+
+    def close(self):
+        if not self._log.closed:
+            self._log.close()
+            if self.manifest is not None:
+                self.manifest.replace(self._log.name, self.filename, self._digest.hexdigest())
+
+
+class CompressedCaptureLog(object):
+    """
+    Writer for a module's captured output as a compressed log store (see
+    :mod:`pytest_docgen.logstore`). Each test's capture is a gzip member of its own, so it can be
+    read back on its own from its offset and length, and is indexed by test id.
+
+    With a :class:`DocManifest`, the store is written to a temporary file alongside, and only
+    moved into place on close if its content changed, as for :class:`CaptureLog`.
+    """
+
+    def __init__(self, filename, manifest=None):
+        self.filename = filename
+        self.manifest = manifest
+        if manifest is not None:
+            self._store = LogStoreWriter(filename + ".tmp")
+        else:
+            self._store = LogStoreWriter(filename, append=True)
+
+    def append(self, capstdout=None, capstderr=None, test_id=None):
+        """
+        Write captured output to the log store.
+
+        :param str test_id: ID of the test, to index the capture by
+        :return: (start, end) offsets of the compressed capture in the store. They're the same if
+            nothing was captured.
+        :rtype: tuple
+        """
+        text = "".join(
+            CAPTURE_HEADER + captured + CAPTURE_FOOTER
+            for captured in (capstdout, capstderr)
+            if captured
+        )
+        if not text:
+            return 0, 0
+        offset, length = self._store.add(test_id, "Captured Output", text)
+        return offset, offset + length
+
+    def close(self):
+        written = self._store.close()
+        if written and self.manifest is not None:
+            (store, digest), (index, index_digest) = written
+            self.manifest.replace(store, self.filename, digest)
+            self.manifest.replace(index, index_filename(self.filename), index_digest)
+
+
+class CaptureLogs(object):
+    """
+    Open CaptureLog writers, keyed by log filename.
+
+    :param bool compress: Write :class:`CompressedCaptureLog` log stores instead, each named after
+        its log with ``.gz`` added.
+    """
+
+    def __init__(self, manifest=None, compress=False):
+        self.manifest = manifest
+        self.compress = compress
+        self._logs = {}
+
+    def get(self, filename):
+        capture_log = self._logs.get(filename)
+        if capture_log is None:
+            if self.compress:
+                capture_log = CompressedCaptureLog(filename + ".gz", self.manifest)
+            else:
+                capture_log = CaptureLog(filename, self.manifest)
+            self._logs[filename] = capture_log
+        return capture_log
+
+    def close(self, filename=None):
+        """
+        Close the writer for ``filename``, or every writer if no filename is given.
+        """
+        if filename is None:
+            for capture_log in self._logs.values():
+                capture_log.close()
+            self._logs.clear()
+        else:
+            capture_log = self._logs.pop(filename, None)
+            if capture_log is not None:
+                capture_log.close()
+
+
+class CaptureReader(object):
+    """
+    Reads line ranges back out of a captured output log. The offset of every line is found with
+    one pass over the file, the first time it's read from.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._offsets = None
+
+    def lines(self, start, end):
+        """
+        Read lines ``start`` to ``end`` (inclusive, counted from 1), as given to
+        ``literalinclude :lines:``.
+        """
+        if self._offsets is None:
+            self._offsets = array("Q", [0])
+            with open(self.filename, "rb") as f:
+                for line in f:
+                    self._offsets.append(self._offsets[-1] + len(line))
+        last = len(self._offsets) - 1
+        start = min(start, last + 1)
+        end = min(end, last)
+        with open(self.filename, "rb") as f:
+            f.seek(self._offsets[start - 1])
+            data = f.read(max(0, self._offsets[end] - self._offsets[start - 1]))
+        return data.decode("utf-8")
+
+
+class RenderLogs(object):
+    """
+    The log stores written while rendering documents with ``--rst-log-mode=lazy``, and the
+    captured output logs read from for them.
+
+    Each store is written to a temporary file alongside, and only moved into place on close if
+    its content changed, as for the documents.
+
+    :param dict previous_digests: The digest each file was last written with, by filename.
+    """
+
+    def __init__(self, previous_digests=None):
+        self.previous_digests = previous_digests or {}
+        self._stores = {}
+        self._captures = {}
+
+    def add(self, filename, test_id, name, text):
+        """
+        Add a log to the log store ``filename``. See :meth:`LogStoreWriter.add`.
+        """
+        store = self._stores.get(filename)
+        if store is None:
+            store = self._stores[filename] = LogStoreWriter(filename + ".tmp")
+        return store.add(test_id, name, text)
+
+    def capture(self, filename, start, end):
+        """
+        Read a capture's lines from a captured output log.
+        """
+        reader = self._captures.get(filename)
+        if reader is None:
+            reader = self._captures[filename] = CaptureReader(filename)
+        return reader.lines(start, end)
+
+    def close(self):
+        """
+        Close every log store.
+
+        :return: The filename and digest of each file written.
+        :rtype: list
+        """
+        written = []
+        for filename, store in self._stores.items():
+            for (src, digest), dst in zip(store.close(), [filename, index_filename(filename)]):
+                if self.previous_digests.get(dst) == digest and os.path.exists(dst):
+                    os.remove(src)
+                else:
+                    os.replace(src, dst)
+                written.append((dst, digest))
+        self._stores.clear()
+        self._captures.clear()
+        return written
+
+
+class FailureText(object):
+    """
+    The longrepr text of a failed (or skipped) test phase, either held in memory or stored in a
+    failure log's sidecar file.
+    """
+
+    def __init__(self, text=None, filename=None, offset=0, length=0, skipped=False):
+        self._text = text
+        self.skipped = skipped
+        self.filename = filename
+        self.offset = offset
+        self.length = length
+
+    def read(self):
+        if self.filename is None:
+            return self._text
+        with open(self.filename, "rb") as f:
+            f.seek(self.offset)
+            return f.read(self.length).decode("utf-8")
+
+    def lines(self):
+        """
+        :return: The text's lines, indented for the failure details code block.
+        :rtype: list
+        """
+        return ["".join(["   ", x]) for x in self.read().split("\n")]
+
+
+class FailureLog(object):
+    """
+    Failure texts of a module's tests. Identical texts are only stored once. Once the session's
+    memory budget for failures is used up, new texts are written to a sidecar file rather than
+    kept in memory, and read back from it when the document is rendered.
+    """
+
+    def __init__(self, filename, failure_logs):
+        self.filename = filename
+        self.size = 0
+        self._failure_logs = failure_logs
+        self._texts = {}
+        self._log = None
+
+    def add(self, text, skipped=False):
+        """
+        :param bool skipped: Whether the text is the reason a phase was skipped.
+        :return: The stored failure text.
+        :rtype: FailureText
+        """
+        key = (_digest(text), skipped)
+        failure = self._texts.get(key)
+        if failure is not None:
+            return failure
+        data = text.encode("utf-8")
+        if self._failure_logs.reserve(len(data)):
+            self.size += len(data)
+            failure = FailureText(text, skipped=skipped)
+        else:
+            if self._log is None:
+                log_dir = os.path.dirname(self.filename)
+                if log_dir:
+                    os.makedirs(log_dir, exist_ok=True)
+                self._log = open(self.filename, "wb")
+            offset = self._log.tell()
+            self._log.write(data)
+            # Documents may be rendered in other processes, which read the file themselves.
+            self._log.flush()
+            failure = FailureText(
+                filename=self.filename, offset=offset, length=len(data), skipped=skipped
+            )
+        self._texts[key] = failure
+        return failure
+
+    def close(self):
+        """
+        Release the texts, once the module's document has been written. The sidecar file is
+        removed.
+        """
+        self._failure_logs.release(self.size)
+        self.size = 0
+        self._texts = {}
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+            os.remove(self.filename)
+
+
+class FailureLogs(object):
+    """
+    Open FailureLogs, keyed by sidecar filename, sharing one memory budget.
+
+    :param int budget: Bytes of failure text to keep in memory.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.size = 0
+        self._logs = {}
+
+    def reserve(self, size):
+        """
+        :return: Whether ``size`` more bytes of failure text fit into memory.
+        """
+        if self.size + size > self.budget:
+            return False
+        self.size += size
+        return True
+
+    def release(self, size):
+        self.size -= size
+
+    def get(self, filename):
+        failure_log = self._logs.get(filename)
+        if failure_log is None:
+            failure_log = self._logs[filename] = FailureLog(filename, self)
+        return failure_log
+
+    def close(self, filename=None):
+        """
+        Close the log for ``filename``, or every log if no filename is given.
+        """
+        if filename is None:
+            for failure_log in self._logs.values():
+                failure_log.close()
+            self._logs.clear()
+        else:
+            failure_log = self._logs.pop(filename, None)
+            if failure_log is not None:
+                failure_log.close()
+
+
+def _text_size(text):
+    """
+    Size of ``text`` in bytes, as UTF-8.
+    """
+    return len(text.encode("utf-8", "replace"))
+
+
+def _line_count(text):
+    return text.count("\n") + (1 if text and not text.endswith("\n") else 0)
+
+
+def _head_tail(text, lines, max_bytes=None):
+    """
+    Split the first and last ``lines`` lines off ``text``, each cut down to half of
+    ``max_bytes`` if given. A character that would only partly fit is left out.
+
+    :return: The head and the tail. Together they're never more than the whole text.
+    :rtype: tuple
+    """
+    head_end = 0
+    for _ in range(lines):
+        head_end = text.find("\n", head_end) + 1
+        if not head_end:
+            head_end = len(text)
+            break
+    tail_start = len(text) - (1 if text.endswith("\n") else 0)
+    for _ in range(lines):
+        tail_start = text.rfind("\n", 0, tail_start)
+        if tail_start < 0:
+            break
+    tail_start = max(tail_start + 1, head_end)
+    head, tail = text[:head_end], text[tail_start:]
+    if max_bytes is not None:
+        half = max_bytes // 2
+        head = head.encode("utf-8", "replace")[:half].decode("utf-8", "ignore")
+        tail = tail.encode("utf-8", "replace")
+        tail = tail[len(tail) - half :].decode("utf-8", "ignore") if half else ""
+    return head, tail
+
+
+class LogBudget(object):
+    """
+    Byte and line budgets for the logs and captured output kept for each test, and for the whole
+    session. Output that doesn't fit into what's left of the budgets is cut down to its first and
+    last ``keep_lines`` lines, around a marker saying what was left out. The lines kept are never
+    more than the smallest of the budgets, so that a test still gets them once the session's
+    budget is used up, but a single huge line is cut too.
+
+    With xdist, only the controller has a budget, and fits each test's output into it as the
+    test's record arrives from its worker.
+
+    :param int test_bytes: Bytes of output to keep for each test, or 0 for no limit.
+    :param int test_lines: Lines of output to keep for each test, or 0 for no limit.
+    :param int session_bytes: Bytes of output to keep for the session, or 0 for no limit.
+    :param int session_lines: Lines of output to keep for the session, or 0 for no limit.
+    :param int keep_lines: Lines to keep from the start and end of output over the budget.
+    :param bool archive: Write the whole of each output that's cut down to a compressed log
+        store (see :mod:`pytest_docgen.logstore`) next to the module's log,
+        ``<module>.archive.gz``.
+    """
+
+    def __init__(
+        self,
+        test_bytes=0,
+        test_lines=0,
+        session_bytes=0,
+        session_lines=0,
+        keep_lines=50,
+        archive=False,
+    ):
+        self.test_bytes = test_bytes
+        self.test_lines = test_lines
+        self.session_bytes = session_bytes
+        self.session_lines = session_lines
+        self.keep_lines = keep_lines
+        self.archive = archive
+        self.session_used = [0, 0]
+        self._test = None
+        self._test_used = [0, 0]
+        self._archives = {}
+
+    def _left(self):
+        """
+        :return: The bytes and lines left, and the smallest byte and line budgets. None where
+            there's no limit.
+        :rtype: tuple
+        """
+        left = []
+        smallest = []
+        for budgets in [
+            [(self.test_bytes, self._test_used[0]), (self.session_bytes, self.session_used[0])],
+            [(self.test_lines, self._test_used[1]), (self.session_lines, self.session_used[1])],
+        ]:
+            budgets = [(limit, used) for limit, used in budgets if limit]
+            if not budgets:
+                left.append(None)
+                smallest.append(None)
+                continue
+            left.append(max(0, min(limit - used for limit, used in budgets)))
+            smallest.append(min(limit for limit, _ in budgets))
+        return tuple(left + smallest)
+
+    def _use(self, size, lines):
+        for used in (self._test_used, self.session_used):
+            used[0] += size
+            used[1] += lines
+
+    def trim(self, doccol, name, text):
+        """
+        Fit a test's output into the budgets.
+
+        :param NodeDocCollector doccol: The test's doc collector. The per-test budget starts
+            again with each new test.
+        :param str name: Name of the output, e.g. the test phase, or ``stdout``
+        :param str text: The output
+        :return: The output, cut down if it was over the budgets.
+        :rtype: str
+        """
+        if doccol.node_id != self._test:
+            self._test = doccol.node_id
+            self._test_used = [0, 0]
+        size, lines = _text_size(text), _line_count(text)
+        bytes_left, lines_left, max_bytes, max_lines = self._left()
+        if (bytes_left is None or size <= bytes_left) and (
+            lines_left is None or lines <= lines_left
+        ):
+            self._use(size, lines)
+            return text
+
+        keep_lines = self.keep_lines
+        if max_lines is not None:
+            keep_lines = min(keep_lines, max_lines // 2)
+        head, tail = _head_tail(text, keep_lines, max_bytes)
+        if len(head) + len(tail) == len(text):
+            # Nothing to leave out.
+            self._use(size, lines)
+            return text
+        kept_size = _text_size(head) + _text_size(tail)
+        elided = text[len(head) : len(text) - len(tail)]
+        elided_lines = _line_count(elided)
+        marker = "[... {} {} ({} bytes) of {} elided".format(
+            elided_lines, "line" if elided_lines == 1 else "lines", size - kept_size, name
+        )
+        if self.archive:
+            filename = "{}.archive.gz".format(doccol.log_location)
+            store = self._archives.get(filename)
+            if store is None:
+                store = self._archives[filename] = LogStoreWriter(filename)
+            store.add(doccol.node_id, name, text)
+            # Note: popping off the top-level directory, as that's the top level rst_dir
+            marker += "; the whole of it is in {}".format(_pop_top_dir(filename))
+        marker += " ...]\n"
+        if head and not head.endswith("\n"):
+            head += "\n"
+        self._use(kept_size, _line_count(head) + _line_count(tail))
+        return "".join([head, marker, tail])
+
+    def close(self, filename=None):
+        """
+        Close the archive ``filename``, or every archive if no filename is given.
+
+        :return: The filename and digest of each file written.
+        :rtype: list
+        """
+        if filename is None:
+            stores = list(self._archives.values())
+            self._archives.clear()
+        else:
+            stores = [self._archives.pop(filename)] if filename in self._archives else []
+        written = []
+        for store in stores:
+            written.extend(store.close())
+        return written
+
+
+def _log_budget(settings):
+    """
+    :return: The session's :class:`LogBudget`, or None if the logs aren't limited.
+    """
+    limits = [
+        settings.log_test_bytes,
+        settings.log_test_lines,
+        settings.log_session_bytes,
+        settings.log_session_lines,
+    ]
+    if not any(limits):
+        return None
+    return LogBudget(*limits, keep_lines=settings.log_keep_lines, archive=settings.log_archive)
+
+
 class NodeDocCollector(object):
+    # There's a collector for every test item, so they're kept small.
+    __slots__ = (
+        "node_id",
+        "node_name",
+        "node_doc",
+        "write_toc",
+        "source_file",
+        "source_obj",
+        "source_span",
+        "source_path",
+        "write_logs",
+        "children",
+        "_child_ids",
+        "_fixtures",
+        "_fixture_keys",
+        "_results",
+        "level",
+        "log_location",
+        "log_data",
+        "capture_start",
+        "capture_end",
+        "build_order",
+        "generic_sections",
+        "aggregate_params",
+    )
+
     def __init__(
         self,
         node_name,
@@ -86,13 +965,23 @@ class NodeDocCollector(object):
         source_file=None,
         source_obj=None,
         log_location=None,
+        settings=None,
+        source_span=None,
+        source_path=None,
         config=None,
     ):
-        cut_dir = config.getoption("rst_cut_dir")
-        if cut_dir:
-            rex = re.compile(r"^{}[.\\/]".format(cut_dir))
-            node_name = rex.sub("", node_name, 1)
-            node_id = rex.sub("", node_id, 1)
+        """
+        :param DocgenSettings settings: The resolved docgen options.
+        :param config: A pytest config to resolve the options from instead, as collectors were
+            built before :class:`DocgenSettings`. Also accepted in place of ``settings``.
+        """
+        if settings is not None and not isinstance(settings, DocgenSettings):
+            config, settings = settings, None
+        if settings is None and config is not None:
+            settings = _config_settings(config)
+        if settings is not None and settings.cut_dir_re is not None:
+            node_name = settings.cut_dir_re.sub("", node_name, 1)
+            node_id = settings.cut_dir_re.sub("", node_id, 1)
 
         self.node_id = node_id.replace(":", "_")
         self.node_name = node_name
@@ -100,20 +989,32 @@ class NodeDocCollector(object):
         self.write_toc = write_toc
         self.source_file = source_file
         self.source_obj = source_obj
+        # Lines of the test in its file, to include those rather than have Sphinx find the
+        # source_obj. With source_path too, they're written inline.
+        self.source_span = source_span
+        self.source_path = source_path
         self.write_logs = level == "function"
         # Children should be a list of NodeDocCollectors of a smaller level.
         # Can be chained on down.
         self.children = []
+        # Identity of each child, and dedup key of each fixture, for constant time lookups.
+        # Test functions never get children, so that set is only made for the first child.
+        self._child_ids = None
         self._fixtures = []
+        self._fixture_keys = set()
         self._results = []
         self.level = level
 
         self.log_location = path.splitext(log_location)[0] if log_location else None
-        self.log_data = OrderedDict()
+        self.log_data = {}
         self.capture_start = 0
         self.capture_end = 0
-        self.build_order = DEFAULT_BUILD_ORDER[:]
+        # A list of its own, which the collector's sections are added to.
+        self.build_order = list(
+            settings.build_order if settings is not None else DEFAULT_BUILD_ORDER
+        )
         self.generic_sections = {}
+        self.aggregate_params = settings.aggregate_params if settings is not None else False
         if log_location:
             log_dir = os.path.dirname(self.log_location)
             os.makedirs(log_dir, exist_ok=True)
@@ -125,6 +1026,19 @@ class NodeDocCollector(object):
             len(self.children),
         )
 
+    def __getstate__(self):
+        # Fixture results can be any object, which might not be picklable. They're only ever
+        # written out as text, so send them to worker processes that way.
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state["_fixtures"] = [
+            (name, doc, _fixture_result_text(result)) for name, doc, result in self._fixtures
+        ]
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def _build_toc(self, rst):
         rst.directive(name="toctree", fields=[("hidden", ""), ("includehidden", "")])
         rst.newline()
@@ -132,17 +1046,19 @@ class NodeDocCollector(object):
         rst.directive(name="contents")
         rst.newline(2)
 
-    def _build_fixtures(self, rst):
-        if not self._fixtures:
+    def _build_fixtures(self, rst, fixtures=None):
+        if fixtures is None:
+            fixtures = self._fixtures
+        if not fixtures:
             return
         rst.directive(
             name="topic", arg="{}{} Preconditions".format(self.level[0].upper(), self.level[1:])
         )
         rst.newline()
 
-        for fixture_name, fixture_doc, fixture_result in self._fixtures:
+        for fixture_name, fixture_doc, fixture_result in fixtures:
             rst.definition(
-                name=fixture_name, text="\n".join(fixture_doc), indent=3, wrap=False
+                name=fixture_name, text=fixture_doc, indent=3, wrap=False
             )  # Note: indent is 3 here so that it shows up under the Fixtures panel.
 
             if fixture_result:
@@ -167,13 +1083,28 @@ class NodeDocCollector(object):
         rst.h5("Source Code")
         rst.newline()
         rst.directive("collapsible-block")
-        rst.directive(
-            "literalinclude",
-            arg=self.source_file,
-            # Just do raw lines. We could do the pyobject though....
-            fields=[("pyobject", self.source_obj)],
-            indent=3,
-        )
+        if self.source_span is None:
+            rst.directive(
+                "literalinclude",
+                arg=self.source_file,
+                # Just do raw lines. We could do the pyobject though....
+                fields=[("pyobject", self.source_obj)],
+                indent=3,
+            )
+        elif self.source_path is None:
+            rst.directive(
+                "literalinclude",
+                arg=self.source_file,
+                fields=[("lines", "{}-{}".format(*self.source_span))],
+                indent=3,
+            )
+        else:
+            rst.directive(
+                "code-block",
+                arg="python",
+                content=source_lines(self.source_path, self.source_span),
+                indent=3,
+            )
         rst.newline()
 
     def _build_results(self, rst):
@@ -193,11 +1124,11 @@ class NodeDocCollector(object):
         rst.newline()
 
         for when, outcome in self._results:
-            if outcome == "PASSED":
+            if outcome == PASSED:
                 continue
             else:
                 rst.h5("{} Failure Details".format(when))
-                rst.codeblock(content=outcome, language="python")
+                rst.codeblock(content=outcome.lines(), language="python")
         rst.newline()
 
     def _build_logs(self, rst):
@@ -205,6 +1136,9 @@ class NodeDocCollector(object):
             return
         rst.h5("Test Output")
         rst.newline()
+        if _render_logs is not None:
+            self._build_lazy_logs(rst)
+            return
 
         for when, data in self.log_data.items():
             rst.directive("collapsible-block", fields=[("heading", when)])
@@ -218,6 +1152,18 @@ class NodeDocCollector(object):
             rst.newline()
             rst.directive("collapsible-block")
             rst.newline()
+            if _render_log_compress:
+                rst.directive(
+                    "docgen-log-include",
+                    arg="{}.log.gz".format(_pop_top_dir(self.log_location)),
+                    fields=[
+                        ("offset", str(self.capture_start)),
+                        ("length", str(self.capture_end - self.capture_start)),
+                    ],
+                    indent=3,
+                )
+                rst.newline()
+                return
             rst.directive(
                 "literalinclude",
                 # Note: popping off the top-level directory, as that's the top level rst_dir
@@ -228,10 +1174,49 @@ class NodeDocCollector(object):
             )
             rst.newline()
 
-    def _build(self):
+    def _build_lazy_logs(self, rst):
+        """
+        Write the logs to the test file's log store, with a placeholder for each that the
+        ``pytest_docgen.sphinxext.lazy_log`` extension loads it into, when it's expanded.
+        """
+        # Note: popping off the top-level directory, as that's the top level rst_dir
+        store = "{}.logs.gz".format(_pop_top_dir(self.log_location))
+        logs = []
+        for name, text in self.log_data.items():
+            offset, length = _render_logs.add(
+                "{}.logs.gz".format(self.log_location), self.node_id, name, text
+            )
+            logs.append((store, name, offset, length))
+        if self.capture_start != self.capture_end:
+            if _render_log_compress:
+                # Already in a log store of its own, as with every run in lazy mode.
+                offset, length = self.capture_start, self.capture_end - self.capture_start
+                capture_store = "{}.log.gz".format(_pop_top_dir(self.log_location))
+                logs.append((capture_store, "Captured Output", offset, length))
+            else:
+                # Rendered from the result store of a run that wrote a plain text log.
+                capture = _render_logs.capture(
+                    "{}.log".format(self.log_location), self.capture_start, self.capture_end
+                )
+                offset, length = _render_logs.add(
+                    "{}.logs.gz".format(self.log_location), self.node_id, "Captured Output", capture
+                )
+                logs.append((store, "Captured Output", offset, length))
+        for log_store, name, offset, length in logs:
+            rst.directive(
+                "docgen-log",
+                arg=log_store,
+                fields=[("heading", name), ("offset", str(offset)), ("length", str(length))],
+            )
+            rst.newline()
+
+    def _build(self, case=False, children=None):
         """
         Build the RST doc for the current collector.
 
+        :param bool case: Build it as a case of an aggregated parametrized test, whose
+            :class:`ParamGroup` has already written the docstring and source.
+        :param list children: Build it with these children instead of its own.
         :return: rstcloth.rst object.
         """
         rst = RstCloth()
@@ -244,18 +1229,60 @@ class NodeDocCollector(object):
         rst.newline()
         getattr(rst, SESSION_HEADER_MAP[self.level])(self.node_name)
         rst.newline()
-        rst.content(doc_prep(self.node_doc))
-        rst.newline()
+        if not case:
+            rst.content(doc_prep(self.node_doc))
+            rst.newline()
 
         for item in self.build_order:
-            self._build_section(item, rst)
+            if case and item == "source":
+                continue
+            if _render_profile is None:
+                self._build_section(item, rst)
+            else:
+                with _render_profile.timer(BUILD_SECTION_NAMES.get(item, "_build_generic")):
+                    self._build_section(item, rst)
 
-        for subdoc in self.children:
+        for subdoc in self._child_docs() if children is None else children:
             rst._add(subdoc.emit())
             rst.newline(2)
         return rst
 
-    def _build_section(self, section, rst):
+    def _child_docs(self):
+        """
+        The children to write, in order. With ``aggregate_params``, each run of consecutive cases
+        of a parametrized test function is grouped into a :class:`ParamGroup`. Cases are never
+        moved, so a function whose cases ran apart (e.g. in random order) gets a group per run.
+        """
+        if not self.aggregate_params:
+            return self.children
+        docs = []
+        labelled = set()
+        for function_name, cases in itertools.groupby(
+            self.children, lambda child: child.param_function_name() or id(child)
+        ):
+            cases = list(cases)
+            if len(cases) == 1:
+                docs.append(cases[0])
+            else:
+                docs.append(ParamGroup(function_name, cases, label=function_name not in labelled))
+                labelled.add(function_name)
+        return docs
+
+    def param_function_name(self):
+        """
+        The name of the test function, if this collector is a case of a parametrized test.
+        """
+        if self.level != "function" or not self.node_name.endswith("]"):
+            return None
+        return self.node_name.partition("[")[0] or None
+
+    def failed(self):
+        """
+        Whether any stage of this test failed.
+        """
+        return any(outcome != PASSED for _, outcome in self._results)
+
+    def _build_section(self, section, rst):
         if section == "results":
             self._build_results(rst)
         elif section == "source":
@@ -319,12 +1346,34 @@ class NodeDocCollector(object):
         """
         if fixturedef.func.__name__ == "get_direct_param_fixture_func":
             # TODO: the param index typically comes from the request. Might need to add that into args.
-            doc = str(fixturedef.params[param_index])
+            doc = "\n".join(doc_prep(str(fixturedef.params[param_index])))
         else:
-            doc = fixturedef.func.__doc__ or "empty docstring"
-        fixture_info = (fixturedef.argname, doc_prep(doc), result)
-        if fixture_info not in self._fixtures:
-            self._fixtures.append(fixture_info)
+            doc = fixture_doc(fixturedef.func)
+        self._add_fixture_info(fixturedef.argname, doc, result)
+
+    def _add_fixture_info(self, name, doc, result):
+        """
+        Add fixture documentation, unless the same fixture, docs and result are already there.
+        """
+        key = _fixture_key(name, doc, result)
+        if key not in self._fixture_keys:
+            self._fixture_keys.add(key)
+            self._fixtures.append((name, doc, result))
+
+    def add_child(self, child):
+        """
+        Add a child doc collector, unless it's already a child of this one.
+
+        :return: Whether the child was added.
+        :rtype: bool
+        """
+        if self._child_ids is None:
+            self._child_ids = set()
+        elif id(child) in self._child_ids:
+            return False
+        self._child_ids.add(id(child))
+        self.children.append(child)
+        return True
 
     # Logging notes:
     # caplog doesn't always work with get_records. I assume it's order of ops, since i'm kind of creating the fixture
@@ -335,51 +1384,142 @@ class NodeDocCollector(object):
     # Captured stdout/stderr seems to accumulate across the setup/call/teardown. This means you can't just
     # grab the result.stdout/stderr at the given test point. It should only be done probably once-per test.
 
-    def add_logdata(self, log_data, when):
+    def add_logdata(self, log_data, when, log_budget=None):
+        """
+        :param LogBudget log_budget: Budget to fit the log into, if any.
+        """
         if log_data:
-            self.log_data[when] = log_data
+            if log_budget is not None:
+                log_data = log_budget.trim(self, when, log_data)
+            self.log_data[sys.intern(when)] = log_data
 
-    def add_capture(self, capstdout=None, capstderr=None):
+    def add_capture(self, capstdout=None, capstderr=None, capture_log=None, log_budget=None):
+        """
+        Append captured stdout/stderr to the module's log file, and record the line range
+        that the capture occupies for the generated ``literalinclude``.
+
+        :param capstdout: Captured stdout
+        :param capstderr: Captured stderr
+        :param CaptureLog capture_log: Open log writer for this collector's log file. If not
+            given, the log file is opened (and closed) just for this capture.
+        :param LogBudget log_budget: Budget to fit the captured output into, if any.
+        """
+        if log_budget is not None:
+            if capstdout:
+                capstdout = log_budget.trim(self, "stdout", capstdout)
+            if capstderr:
+                capstderr = log_budget.trim(self, "stderr", capstderr)
         # Todo: sort out whether the result stdout capture cares about the when.
         # It looks like it should only be done once, thus the check for teardown.
 
         # Module or Class DocCollectors don't have a log location set, however they
         # *also* don't have a result to add. So this is safe... for now.
-        if not os.path.exists(os.path.dirname(self.log_location)):
-            os.mkdir(os.path.dirname(self.log_location))
-        with open("{}.log".format(self.log_location), "a+") as log:
-            # Seek to end of file.
-            log.seek(0)
-            self.capture_start = log.read().count("\n") + 1
-            self.capture_end = self.capture_start
-            if capstdout:
-                log.write("{0} Captured stdout {0}\n".format("=" * 20))
-                log.write(capstdout)
-                log.write("{0} End stdout {0}\n".format("=" * 20))
-                self.capture_end += capstdout.count("\n") + 1
-            if capstderr:
-                log.write("{0} Captured stdout {0}\n".format("=" * 20))
-                log.write(capstderr)
-                log.write("{0} End stdout {0}\n".format("=" * 20))
-                self.capture_end += capstderr.count("\n") + 1
+        if capture_log is None:
+            capture_log = CaptureLog("{}.log".format(self.log_location))
+            try:
+                self.capture_start, self.capture_end = capture_log.append(
+                    capstdout, capstderr, self.node_id
+                )
+            finally:
+                capture_log.close()
+        else:
+            self.capture_start, self.capture_end = capture_log.append(
+                capstdout, capstderr, self.node_id
+            )
 
-    def add_result(self, result):
+    def add_result(self, result, failure_log=None):
         """
         Add a test result to the documentation.
 
         This will be called 3x for each test -- 1x for setup, 1x for call, 1x for teardown.
 
         :param result: Pytest result object
+        :param FailureLog failure_log: Where to store the failure text of a failed result. If not
+            given, it's kept in memory.
         """
         if result.outcome != "passed":
             # Store the longrepr
             # TODO: This might need to do some munging on the data.
-            outcome = ["".join(["   ", x]) for x in result.longreprtext.split("\n")]
+            outcome = self._add_failure(
+                result.longreprtext, failure_log, skipped=result.outcome == "skipped"
+            )
         else:
-            outcome = result.outcome.upper()
+            outcome = PASSED
 
         self._results.append((result.when, outcome))
 
+    def _add_failure(self, text, failure_log, skipped=False):
+        if failure_log is None:
+            return FailureText(text, skipped=skipped)
+        return failure_log.add(text, skipped)
+
+    def to_record(self):
+        """
+        Serialize everything gathered for this collector while running tests (fixtures, results,
+        logs and added sections) into builtin types, so it can be shipped between processes.
+
+        :rtype: dict
+        """
+        return {
+            "fixtures": [
+                [name, doc, _fixture_result_text(result)] for name, doc, result in self._fixtures
+            ],
+            "results": [[when] + _outcome_record(outcome) for when, outcome in self._results],
+            "log_data": [[when, data] for when, data in self.log_data.items()],
+            "sections": [[name, content] for name, content in self.generic_sections.items()],
+            "build_order": list(self.build_order),
+        }
+
+    def update_from_record(self, record, failure_log=None, log_budget=None):
+        """
+        Merge in data serialized by :meth:`to_record`. Fixtures and sections that
+        are already known are skipped.
+
+        :param dict record: Serialized collector data
+        :param FailureLog failure_log: Where to store failure texts, as for :meth:`add_result`.
+        :param LogBudget log_budget: Budget to fit the logs into, as for :meth:`add_logdata`.
+        """
+        for name, doc, result in record.get("fixtures", []):
+            self._add_fixture_info(name, doc, result)
+        for when, outcome, skipped in record.get("results", []):
+            if outcome == PASSED:
+                outcome = PASSED
+            else:
+                outcome = self._add_failure(outcome, failure_log, skipped)
+            self._results.append((sys.intern(when), outcome))
+        for when, data in record.get("log_data", []):
+            self.add_logdata(data, when, log_budget)
+        build_order = record.get("build_order", [])
+        for name, content in record.get("sections", []):
+            if not self.has_section(name):
+                self.add_section(
+                    name, content, loc=min(build_order.index(name), len(self.build_order))
+                )
+
+    def walk(self):
+        """
+        Iterate over this collector and all of its descendants, depth first.
+        """
+        yield self
+        for child in self.children:
+            for doccol in child.walk():
+                yield doccol
+
+    def release(self):
+        """
+        Drop everything gathered for this collector and its descendants, once its document
+        has been written.
+        """
+        for child in self.children:
+            child.release()
+        self.children = []
+        self._child_ids = None
+        self._fixtures = []
+        self._fixture_keys = set()
+        self._results = []
+        self.log_data = {}
+        self.generic_sections = {}
+
     def get_all_results(self):
         all_results = []
         local_result = self.get_simple_results()
@@ -400,17 +1540,236 @@ class NodeDocCollector(object):
         if self._results:
             results = {"name": ":ref:`{} <{}>`".format(self.node_name, self.node_id)}
             for when, outcome in self._results:
-                simple_outcome = "".join(outcome)
-                if "PASSED" in simple_outcome:
-                    simple_outcome = "|passed|"
-                else:
-                    simple_outcome = "|failed|"
-                results[when] = simple_outcome
+                results[when] = "|passed|" if outcome == PASSED else "|failed|"
             return results
         else:
             return None
 
 
+def _fixture_key(name, doc, result):
+    """
+    Key fixtures by their result as it's written out, so that equal results (hashable or not)
+    are the same fixture, and different ones never are.
+    """
+    return name, doc, _fixture_result_text(result)
+
+
+class ParamGroup(object):
+    """
+    The cases of a parametrized test function, written together with ``--rst-aggregate-params``:
+    the docstring, fixtures and source once, then a table of each case's outcomes. Only the
+    failed cases are written out in full, after the table.
+
+    Every case keeps its reference label, so links to it from the overview and the failure
+    digest still resolve: a failed case's to its details, the others' to the group.
+    """
+
+    def __init__(self, name, cases, label=True):
+        """
+        :param str name: Name of the test function
+        :param list cases: Doc collectors of the cases
+        :param bool label: Whether to write the test function's reference label. Only the first
+            group of a test function's cases gets it.
+        """
+        self.name = name
+        self.cases = cases
+        self.label = label
+
+    def emit(self):
+        first = self.cases[0]
+        # The failed cases, in order, and a set of their IDs to look them up by.
+        failed = [case for case in self.cases if case.failed()]
+        failed_ids = set(id(case) for case in failed)
+        rst = RstCloth()
+        for case in self.cases:
+            if id(case) not in failed_ids:
+                rst.ref_target(case.node_id)
+        if self.label:
+            rst.ref_target(first.node_id.partition("[")[0])
+        rst.newline()
+        getattr(rst, SESSION_HEADER_MAP[first.level])(self.name)
+        rst.newline()
+        rst.content(doc_prep(first.node_doc))
+        rst.newline()
+
+        for section in first.build_order:
+            if section == "fixtures":
+                first._build_fixtures(rst, self._common_fixtures())
+            elif section == "results":
+                self._build_results(rst, failed_ids)
+            elif section == "source":
+                first._build_source_link(rst)
+        # Logs and added sections are only written for the failed cases.
+
+        for case in failed:
+            rst._add(case._build(case=True).data)
+            rst.newline(2)
+        return rst.data
+
+    def _common_fixtures(self):
+        """
+        The fixtures that are the same for every case. Those that vary with the parameters are
+        written with the failed cases.
+        """
+        return [
+            fixture
+            for fixture in self.cases[0]._fixtures
+            if all(_fixture_key(*fixture) in case._fixture_keys for case in self.cases[1:])
+        ]
+
+    def _build_results(self, rst, failed_ids):
+        rows = []
+        for case in self.cases:
+            res = case.get_simple_results() or {}
+            param = case.node_name[len(self.name) + 1 : -1]
+            if id(case) in failed_ids:
+                param = ":ref:`{} <{}>`".format(param, case.node_id)
+            rows.append(
+                [
+                    param,
+                    res.get("setup", "NOTRUN"),
+                    res.get("call", "NOTRUN"),
+                    res.get("teardown", "NOTRUN"),
+                ]
+            )
+        rst.h5("Results")
+        rst.newline()
+        rst._add(tabulate(rows, ["Parameters", "Setup", "Call", "Teardown"], tablefmt="rst"))
+        rst.newline(2)
+
+
+def get_failures(doc_collector):
+    """
+    Iterate over the failed test phases under a doc collector. Skipped phases aren't failures.
+
+    :return: (doc collector, when, :class:`FailureText`) of each failed phase.
+    """
+    for doccol in doc_collector.walk():
+        for when, outcome in doccol._results:
+            if outcome != PASSED and not outcome.skipped:
+                yield doccol, when, outcome
+
+
+# Memory addresses in reprs, which differ from run to run (and test to test).
+_ADDRESS_RE = re.compile(r"0x[0-9a-fA-F]+")
+# The "path:lineno: ExceptionType" line that ends a long traceback.
+_LOCATION_RE = re.compile(r"^(\S.*):\d+: (\w[\w.]*)$")
+
+
+def failure_signature(text):
+    """
+    Reduce a failure's longrepr text to what identifies its cause: the error lines (those
+    starting with ``E``) and the file and exception type it was raised with. Memory addresses and
+    the line number are dropped, so failures raised from the same place for the same reason get
+    the same signature, whatever the test. Without error lines, the location is all there is to
+    tell failures apart, so it keeps its line number.
+
+    :return: The signature's lines.
+    :rtype: list
+    """
+    lines = text.splitlines()
+    signature = [_ADDRESS_RE.sub("0x", line) for line in lines if line.startswith("E ")]
+    for line in reversed(lines):
+        match = _LOCATION_RE.match(line)
+        if match:
+            if signature:
+                signature.append("{}: {}".format(*match.groups()))
+            else:
+                signature.append(line)
+            break
+    if not signature:
+        # Not a traceback; the whole text is the signature.
+        signature = [_ADDRESS_RE.sub("0x", line) for line in lines]
+    return signature
+
+
+# Characters that can start or end inline markup, or make a title a literal block marker.
+_RST_MARKUP_RE = re.compile(r"([\\`*_|:\[\]<>])")
+
+
+def _rst_escape(text):
+    """
+    Escape RST markup in ``text``, so it's written as it is, e.g. in a title.
+    """
+    return _RST_MARKUP_RE.sub(r"\\\1", text)
+
+
+class FailureDigest(object):
+    """
+    Failures grouped by signature, for ``--rst-failure-digest``. Modules are added as their
+    documents are written, so only the signatures and the tests they link to are kept around.
+    """
+
+    def __init__(self):
+        # Signature digest: [signature lines, [(test name, ref target, when), ...]]
+        self._groups = OrderedDict()
+        self.count = 0
+
+    def add(self, doc_collector):
+        """
+        Add the failures under a doc collector.
+        """
+        # Identical texts within a module are the same FailureText.
+        signatures = {}
+        for doccol, when, failure in get_failures(doc_collector):
+            key = signatures.get(id(failure))
+            if key is None:
+                signature = failure_signature(failure.read())
+                key = signatures[id(failure)] = _digest("\n".join(signature))
+                if key not in self._groups:
+                    self._groups[key] = [signature, []]
+            self._groups[key][1].append((doccol.node_name, doccol.node_id, when))
+            self.count += 1
+
+    def build(self):
+        """
+        :return: The failures.rst document, with the most common causes first.
+        :rtype: RstCloth
+        """
+        rst = RstCloth()
+        rst.title("Failure Digest")
+        rst.newline()
+        rst.content(
+            "{} failed test phases, from {} distinct causes.".format(self.count, len(self._groups))
+        )
+        rst.newline()
+        groups = sorted(self._groups.values(), key=lambda group: len(group[1]), reverse=True)
+        for number, (signature, tests) in enumerate(groups, 1):
+            headline = signature[0][1:].strip() if signature[0].startswith("E ") else signature[-1]
+            rst.h2("{}. {}".format(number, _rst_escape(headline[:100])))
+            rst.newline()
+            rst.content("Failed test phases: **{}**".format(len(tests)))
+            rst.newline()
+            rst.codeblock(content=signature, language="python")
+            rst.newline()
+            for name, node_id, when in tests:
+                rst.li(":ref:`{} <{}>` ({})".format(name, node_id, when), wrap=False)
+            rst.newline()
+        return rst
+
+
+def _outcome_record(outcome):
+    """
+    Reduce a result's outcome to something that can be serialized: its text, and whether the
+    phase was skipped.
+    """
+    if outcome == PASSED:
+        return [PASSED, False]
+    return [outcome.read(), outcome.skipped]
+
+
+def _fixture_result_text(result):
+    """
+    Reduce a fixture result to something that can be serialized, but is written out the
+    same way by ``_build_fixtures``.
+    """
+    if not result:
+        return None
+    if isinstance(result, (str, bytes)):
+        return result
+    return str(result)
+
+
 def get_level(item):
     """
     Return the current pytest collection level an item is at.
@@ -428,6 +1787,51 @@ def get_level(item):
         raise Exception("Unknown level of item!")
 
 
+def _parent_doccol(settings, name, doc, nodeid, level):
+    """
+    Create the doc collector for a module or class.
+    """
+    return NodeDocCollector(
+        name,
+        doc,
+        "{}{}".format(settings.label_prefix, nodeid),
+        level=level,
+        write_toc=level == "module",
+        settings=settings,
+    )
+
+
+def _function_doccol(settings, name, doc, nodeid, source_file, source_obj, location):
+    """
+    Create the doc collector for a test function.
+
+    :param str source_file: Path to the file the test is defined in.
+    :param str source_obj: Name of the test (with its class, if any) within that file.
+    :param str location: Path of the test file relative to the test root (``item.location[0]``)
+    """
+    span = source_path = None
+    if settings.source_mode != "pyobject":
+        span = source_span(source_file, source_obj)
+        if span is not None and settings.source_mode == "inline":
+            source_path = path.abspath(source_file)
+    return NodeDocCollector(
+        node_name=name,
+        node_doc=doc,
+        node_id="{}{}".format(settings.label_prefix, nodeid),
+        level="function",
+        source_file=path.relpath(source_file, settings.rst_dir),
+        source_obj=source_obj,
+        # Log location right now is **directory printing_tests**.
+        # That's because we use the test.location, which is a direct path to the
+        # test file from the test root.
+        # This could be changed to be a flat structure if we wanted.
+        log_location=path.join(settings.rst_dir, "logs", location.replace(".py", ".log")),
+        settings=settings,
+        source_span=span,
+        source_path=source_path,
+    )
+
+
 def doccollect_parent(item, prev_item=None):
     """
     Set up doc collectors for each level.
@@ -452,7 +1856,8 @@ def doccollect_parent(item, prev_item=None):
     when we step up a level, we check to see if there is already a pre-existing DocCollector.
 
     If there is a pre-existing parent DocCollector, we will append the *current* DocCollector as a child of the parent.
-    This ensures that structure of the final documents is correct.
+    This ensures that structure of the final documents is correct. If the current DocCollector is already a child
+    of the parent, everything above it has been linked up by an earlier test, so we stop there.
 
     Original pytest structure::
 
@@ -498,7 +1903,8 @@ def doccollect_parent(item, prev_item=None):
 
     if isinstance(item.parent, Session):
         # End recursion -- we hit the top level
-        if prev_item._doccol not in item.parent.doc_collectors:
+        if id(prev_item._doccol) not in item.parent.doc_collector_ids:
+            item.parent.doc_collector_ids.add(id(prev_item._doccol))
             item.parent.doc_collectors.append(prev_item._doccol)
         return
     if isinstance(item.parent, Instance):
@@ -508,246 +1914,1532 @@ def doccollect_parent(item, prev_item=None):
     parent = item.parent
     doccol = getattr(parent, "_doccol", None)
     if doccol is None:
-        level = get_level(parent)
-        doccol = NodeDocCollector(
+        doccol = _parent_doccol(
+            item.session.doc_settings,
             parent.obj.__name__,
             parent.obj.__doc__,
-            "{}{}".format(item.session.config.getoption("rst_label_prefix"), parent.nodeid),
-            level=level,
-            write_toc=level == "module",
-            config=item.session.config,
+            parent.nodeid,
+            get_level(parent),
         )
         parent._doccol = doccol
 
-    if prev_item._doccol not in doccol.children:
-        doccol.children.append(prev_item._doccol)
-    doccollect_parent(parent)
+    if doccol.add_child(prev_item._doccol):
+        doccollect_parent(parent)
+    # Otherwise, the parent was already linked all the way up to the session by an
+    # earlier test.
 
 
-@pytest.hookimpl(hookwrapper=True)
-def pytest_collection_modifyitems(session, config, items):
+def _take_logdata(item, when):
     """
-    Add NodeDocCollectors to each level of test collectors:
+    Return the log output captured for a test phase.
 
-        * Function
-        * Class
-        * Module
-        * Session (note: session keeps track of the sub-collectors for output at end of
-        test session)
+    Each phase's log section is added to the item's report sections as the phase finishes, so
+    only the sections added since the previous phase need to be looked at.
     """
-    yield
-    if config.getoption("rst_dir"):
-        # Note: we shouldn't need to modify the item list, but we should
-        # run *after* list has been pared down.
-        for test in items:
-            # TBD: not completely sure if this is correct call
-            if test.cls:
-                prefix = test.cls.__name__ + "."
-            else:
-                prefix = ""
-            test_doccol = NodeDocCollector(
-                node_name=test.name,
-                node_doc=test.obj.__doc__,
-                node_id="{}{}".format(
-                    test.session.config.getoption("rst_label_prefix"), test.nodeid
-                ),
-                level="function",
-                source_file=path.relpath(
-                    str(test.fspath), test.session.config.getoption("rst_dir")
-                ),
-                source_obj="{}{}".format(prefix, test.obj.__name__),
-                # Log location right now is **directory printing_tests**.
-                # That's because we use the test.location, which is a direct path to the
-                # test file from the test root.
-                # This could be changed to be a flat structure if we wanted.
-                log_location=path.join(
-                    test.session.config.getoption("rst_dir"),
-                    "logs",
-                    test.location[0].replace(".py", ".log"),
-                ),
-                config=config,
-            )
-            test._doccol = test_doccol
-            doccollect_parent(test)
+    sections = item._report_sections
+    start = getattr(item, "_doc_log_cursor", 0)
+    item._doc_log_cursor = len(sections)
+    return "".join(
+        content
+        for section_when, key, content in sections[start:]
+        if section_when == when and key == "log"
+    )
 
 
-@pytest.hookimpl(hookwrapper=True)
-def pytest_fixture_setup(fixturedef, request):
+def _module_nodeid(nodeid):
     """
-    We can use this pytest hook to add in fixture doc info into each
-    NodeDocCollector
+    Return the node ID of the module that a test node ID belongs to.
     """
-    outcome = yield
-    res = None
-    if request.config.getoption("rst_dir"):
-        if request.config.getoption("rst_fixture_results", None) or getattr(
-            fixturedef.func, "_doc_result", False
+    return nodeid.split("::", 1)[0]
+
+
+# Directives whose argument is a path, relative to the document it's in.
+_PATH_DIRECTIVE_RE = re.compile(
+    r"^(\s*\.\. (?:literalinclude|include|image|figure|docgen-log|docgen-log-include)::\s+)"
+    r"(?!/)(\S)",
+    re.MULTILINE,
+)
+SHARD_PAGE = "part-{}"
+
+
+def _relocate(lines, prefix):
+    """
+    Rewrite the relative paths of included files in RST lines, for a document that's moved to a
+    subdirectory of where it was rendered for.
+
+    :param str prefix: Path from the new location back to the old one, e.g. ``..``
+    """
+    return [_PATH_DIRECTIVE_RE.sub(r"\1{}/\2".format(prefix), line) for line in lines]
+
+
+def _count_tests(doc):
+    if isinstance(doc, ParamGroup):
+        return len(doc.cases)
+    return sum(1 for doccol in doc.walk() if doccol.level == "function")
+
+
+class _Rendered(object):
+    """
+    A child document that has already been rendered.
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def emit(self):
+        return self.lines
+
+
+def _render_shards(doc_collector, filename, shard_tests=0, shard_size=0):
+    """
+    Render a module's document, split into pages if it has more than ``shard_tests`` tests or
+    would be bigger than ``shard_size`` bytes. Its classes and tests are then written to pages
+    of up to that many tests or bytes each, in a directory named after the module, and the
+    module's own document becomes an index of them. A class is never split, so a page can go
+    over the limits when one class does.
+
+    :return: The filename and text of each document.
+    :rtype: list
+    """
+    units = []
+    for child in doc_collector._child_docs():
+        lines = child.emit()
+        units.append((lines, _count_tests(child), sum(len(line) + 1 for line in lines)))
+    total_tests = sum(tests for _, tests, _ in units)
+    total_size = sum(size for _, _, size in units)
+    if not (shard_tests and total_tests > shard_tests) and not (
+        shard_size and total_size > shard_size
+    ):
+        rst = doc_collector._build(children=[_Rendered(lines) for lines, _, _ in units])
+        return [(filename, "\n".join(rst.data) + "\n")]
+
+    pages = [[]]
+    page_tests = page_size = 0
+    for unit in units:
+        _, tests, size = unit
+        if pages[-1] and (
+            (shard_tests and page_tests + tests > shard_tests)
+            or (shard_size and page_size + size > shard_size)
         ):
-            # Note: force the result to be a string. We don't want to be keeping around possibly very large
-            # objects that might be returned by fixtures. Also it ensures that we capture the state of the fixture
-            # *now* after setup is done, rather than what it might be at the time of the doc generation (end of test run)
-            try:
-                doccol = request.node._doccol
-                doccol.add_fixture(fixturedef, request.param_index, outcome.get_result())
-            except Exception as exc:
-                # TODO: Ignoring exceptions for now, but we should probably handle
-                #  them more gracefully.
-                pass
-
-
-@pytest.hookimpl(hookwrapper=True)
-def pytest_runtest_makereport(item, call):
-    """
-    Add in test results to doc collectors.
-    """
-    outcome = yield
-    if item.session.config.getoption("rst_dir"):
-        res = outcome.get_result()
-        doccol = item._doccol
-        doccol.add_result(res)
-        if res.when == "teardown":
-            doccol.add_capture(capstdout=res.capstdout, capstderr=res.capstderr)
-
-
-@pytest.hookimpl(hookwrapper=True, trylast=True)
-def pytest_runtest_setup(item):
-    yield
-    if item.session.config.getoption("rst_dir"):
-        if PYTEST_NEW_CAPLOG:
-            log_data = "".join(
-                [
-                    log
-                    for when, section, log in item._report_sections
-                    if when == "setup" and section == "log"
-                ]
-            )
-        else:
-            log_data = item.catch_log_handler.stream.getvalue()
-        item._doccol.add_logdata(log_data, "setup")
+            pages.append([])
+            page_tests = page_size = 0
+        pages[-1].append(unit)
+        page_tests += tests
+        page_size += size
+    if len(pages) == 1:
+        # A single class that's over the limits.
+        rst = doc_collector._build(children=[_Rendered(lines) for lines, _, _ in units])
+        return [(filename, "\n".join(rst.data) + "\n")]
+
+    shard_dir = os.path.splitext(filename)[0]
+    docs = []
+    for number, page_units in enumerate(pages, 1):
+        page = RstCloth()
+        getattr(page, SESSION_HEADER_MAP[doc_collector.level])(
+            "{} ({} of {})".format(doc_collector.node_name, number, len(pages))
+        )
+        page.newline()
+        for lines, _, _ in page_units:
+            page._add(_relocate(lines, ".."))
+            page.newline(2)
+        name = SHARD_PAGE.format(number)
+        docs.append((os.path.join(shard_dir, name + ".rst"), "\n".join(page.data) + "\n"))
+
+    rst = doc_collector._build(children=[])
+    rst.directive(name="toctree", fields=[("maxdepth", "2")])
+    rst.newline()
+    rst.content(
+        [
+            "{}/{}".format(os.path.basename(shard_dir), SHARD_PAGE.format(number))
+            for number in range(1, len(pages) + 1)
+        ],
+        3,
+    )
+    rst.newline()
+    docs.insert(0, (filename, "\n".join(rst.data) + "\n"))
+    return docs
 
 
-@pytest.hookimpl(hookwrapper=True, trylast=True)
-def pytest_runtest_call(item):
-    yield
-    if item.session.config.getoption("rst_dir"):
-        if PYTEST_NEW_CAPLOG:
-            log_data = "".join(
-                [
-                    log
-                    for when, section, log in item._report_sections
-                    if when == "call" and section == "log"
-                ]
-            )
+def _remove_stale_shards(filename, docs):
+    """
+    Remove pages of a module's document that weren't written this time, e.g. as the module got
+    smaller.
+    """
+    shard_dir = os.path.splitext(filename)[0]
+    if not os.path.isdir(shard_dir):
+        return
+    written = set(doc_filename for doc_filename, _ in docs)
+    for name in os.listdir(shard_dir):
+        stale = os.path.join(shard_dir, name)
+        if re.match(SHARD_PAGE.format(r"\d+") + r"\.rst$", name) and stale not in written:
+            os.remove(stale)
+
+
+def _write_document(
+    doc_collector,
+    filename,
+    previous_digests=None,
+    profile=False,
+    shard_tests=0,
+    shard_size=0,
+    log_mode="inline",
+    log_compress=False,
+):
+    """
+    Write out a doc collector, unless the file already has the same content (as given by
+    ``previous_digests``). Module level, so it can be run in a worker process.
+
+    :param dict previous_digests: The digest each file was last written with, by filename.
+    :param bool profile: Time the render phases.
+    :param int shard_tests: Split the document into pages of this many tests (see
+        :func:`_render_shards`).
+    :param int shard_size: Split the document into pages of this many bytes.
+    :param str log_mode: ``lazy`` to write the tests' logs to compressed log stores, rather
+        than into the document.
+    :param bool log_compress: Whether the captured output is in compressed log stores.
+    :return: The filename and digest of each document (and log store) written, and the render
+        timings if profiling.
+    """
+    global _render_profile, _render_logs, _render_log_compress
+    _render_log_compress = log_compress
+    if profile:
+        _render_profile = DocgenProfile()
+    previous_digests = previous_digests or {}
+    if log_mode == "lazy":
+        _render_logs = RenderLogs(previous_digests)
+    try:
+        start = time.perf_counter()
+        if shard_tests or shard_size:
+            docs = _render_shards(doc_collector, filename, shard_tests, shard_size)
+            _remove_stale_shards(filename, docs)
         else:
-            log_data = item.catch_log_handler.stream.getvalue()
-        item._doccol.add_logdata(log_data, "call")
+            docs = [(filename, "\n".join(doc_collector.emit()) + "\n")]
+        written = []
+        for doc_filename, text in docs:
+            digest = _digest(text)
+            if digest != previous_digests.get(doc_filename):
+                _write_text(doc_filename, text)
+            written.append((doc_filename, digest))
+        if _render_logs is not None:
+            written.extend(_render_logs.close())
+        if not profile:
+            return written, None
+        _render_profile.add("_write_document", time.perf_counter() - start)
+        return written, {name: list(samples) for name, samples in _render_profile.samples.items()}
+    finally:
+        _render_profile = None
+        _render_log_compress = False
+        if _render_logs is not None:
+            _render_logs.close()
+            _render_logs = None
+
+
+def _lazy_log_stores(doc_collector):
+    """
+    The log stores the tests under a doc collector are written to with ``--rst-log-mode=lazy``.
+    """
+    return set(
+        "{}.logs.gz".format(doccol.log_location)
+        for doccol in doc_collector.walk()
+        if doccol.log_location
+    )
 
 
-@pytest.hookimpl(hookwrapper=True, trylast=True)
-def pytest_runtest_teardown(item):
-    yield
-    if item.session.config.getoption("rst_dir"):
-        if PYTEST_NEW_CAPLOG:
-            log_data = "".join(
-                [
-                    log
-                    for when, section, log in item._report_sections
-                    if when == "teardown" and section == "log"
-                ]
+def _write_modules(session, doc_collectors):
+    """
+    Write out module level doc collectors. With ``--rst-workers``, the documents are rendered and
+    written in a pool of worker processes.
+
+    :return: The overview results for every test in the modules, in order.
+    :rtype: list
+    """
+    settings = session.doc_settings
+    manifest = session.doc_manifest
+    results = []
+    collectors = []
+    filenames = []
+    previous_digests = []
+    for doc_collector in doc_collectors:
+        filename = os.path.join(settings.rst_dir, doc_collector.node_name + ".rst")
+        results.extend(doc_collector.get_all_results())
+        if session.doc_failure_digest is not None:
+            session.doc_failure_digest.add(doc_collector)
+        collectors.append(doc_collector)
+        filenames.append(filename)
+        previous = {}
+        if manifest is not None:
+            previous[filename] = manifest.previous(filename)
+            if settings.shard_tests or settings.shard_size:
+                previous.update(manifest.previous_in(os.path.splitext(filename)[0]))
+            if settings.log_mode == "lazy":
+                for store in _lazy_log_stores(doc_collector):
+                    previous[store] = manifest.previous(store)
+                    previous[index_filename(store)] = manifest.previous(index_filename(store))
+        previous_digests.append(previous)
+
+    profile = [session.doc_profile is not None] * len(collectors)
+    shard_tests = [settings.shard_tests] * len(collectors)
+    shard_size = [settings.shard_size] * len(collectors)
+    log_mode = [settings.log_mode] * len(collectors)
+    log_compress = [settings.log_compress] * len(collectors)
+    workers = settings.workers
+    if workers > 1 and len(collectors) > 1:
+        chunksize = max(1, len(collectors) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            written = list(
+                pool.map(
+                    _write_document,
+                    collectors,
+                    filenames,
+                    previous_digests,
+                    profile,
+                    shard_tests,
+                    shard_size,
+                    log_mode,
+                    log_compress,
+                    chunksize=chunksize,
+                )
             )
-        else:
-            log_data = item.catch_log_handler.stream.getvalue()
-        item._doccol.add_logdata(log_data, "teardown")
+    else:
+        written = [
+            _write_document(*args)
+            for args in zip(
+                collectors,
+                filenames,
+                previous_digests,
+                profile,
+                shard_tests,
+                shard_size,
+                log_mode,
+                log_compress,
+            )
+        ]
+    for docs, samples in written:
+        if manifest is not None:
+            for filename, digest in docs:
+                manifest.record(filename, digest)
+        if samples:
+            session.doc_profile.merge(samples)
+    return results
 
 
-def pytest_sessionstart(session):
+def _write_rst(session, rst, filename):
     """
-    Used to keep track of all doc collectors.
+    Write out an RstCloth document, going through the manifest if there is one.
     """
-    if session.config.getoption("rst_dir"):
-        session.doc_collectors = []
+    if session.doc_manifest is not None:
+        session.doc_manifest.write_text(filename, "\n".join(rst.data) + "\n")
+    else:
+        rst.write(filename)
 
 
-def pytest_sessionfinish(session):
+def _close_log_archives(session, filename=None):
     """
-    Write out results for each doc collector.
+    Close the log budget's archive ``filename``, or every archive, going through the manifest if
+    there is one.
     """
-    if session.config.getoption("rst_dir"):
-        if session.config.getoption("rst_write_index"):
-            index = RstCloth()
-            index.title(session.config.getoption("rst_title", "Test Results"))
-            index.newline()
-            index.content(session.config.getoption("rst_desc", ""))
-            index.newline()
-            index.directive(name="toctree", fields=[("includehidden", ""), ("glob", "")])
-            index.newline()
-            index.content(["*"], 3)
-            index.newline(2)
-            index.write(os.path.join(session.config.getoption("rst_dir"), "index.rst"))
+    if session.log_budget is None:
+        return
+    for archive, digest in session.log_budget.close(filename):
+        if session.doc_manifest is not None:
+            session.doc_manifest.record(archive, digest)
+
+
+def _flush_module(session, module_nodeid, doc_collector):
+    """
+    Write out a finished module and release its doc collectors, keeping only the
+    overview results around.
+    """
+    if session.doc_reorder:
+        _sort_children(doc_collector, session.doc_order)
+    # Flush out the module's captured output before the document is rendered from it.
+    for doccol in doc_collector.walk():
+        if doccol.log_location:
+            session.capture_logs.close("{}.log".format(doccol.log_location))
+            _close_log_archives(session, "{}.archive.gz".format(doccol.log_location))
+    session.doc_results.extend(_write_modules(session, [doc_collector]))
+    for doccol in doc_collector.walk():
+        if doccol.log_location:
+            session.failure_logs.close("{}.failures".format(doccol.log_location))
+        session.doc_order.pop(doccol, None)
+    doc_collector.release()
+    session.doc_collectors.remove(doc_collector)
+    session.doc_collector_ids.discard(id(doc_collector))
+    del session.doc_pending[module_nodeid]
+
+
+def _test_finished(session, module_nodeid, doc_collector):
+    """
+    Count off a finished test, and in streaming mode write out its module if that was the last
+    test in it.
+    """
+    if session.doc_settings.stream:
+        session.doc_pending[module_nodeid] -= 1
+        if session.doc_pending[module_nodeid] <= 0:
+            _flush_module(session, module_nodeid, doc_collector)
 
-        results = []
 
-        for doc_collector in getattr(session, "doc_collectors", []):
-            results.extend(doc_collector.get_all_results())
-            doc_collector.write(
-                os.path.join(session.config.getoption("rst_dir"), doc_collector.node_name + ".rst")
+# pytest-xdist support:
+#
+# Workers build the doc collector tree as usual, but don't write anything. When a test is done,
+# its collector data (and that of its parents) is serialized onto the teardown report, which
+# xdist sends to the controller. The controller rebuilds the tree from those records, writes the
+# captured output from the report, and writes every document once.
+
+
+def _is_xdist_worker(config):
+    return hasattr(config, "workerinput")
+
+
+def _is_xdist_controller(config):
+    return config.pluginmanager.hasplugin("dsession")
+
+
+def _node_record(node):
+    """
+    Serialize a module or class node's doc collector, along with what's needed to recreate it.
+    """
+    record = node._doccol.to_record()
+    record.update(
+        nodeid=node.nodeid, name=node.obj.__name__, doc=node.obj.__doc__, level=node._doccol.level
+    )
+    return record
+
+
+def _doc_record(item):
+    """
+    Build the doc record for a finished test, to send to the xdist controller.
+
+    Parent collectors are only sent in full when they have changed since this worker last sent
+    them; otherwise just their node ID is included.
+
+    :rtype: dict
+    """
+    session = item.session
+    parents = []
+    node = item.parent
+    while node is not None and not isinstance(node, Session):
+        # Instances and Packages don't have their own doc collectors.
+        if getattr(node, "_doccol", None) is not None:
+            record = _node_record(node)
+            if session.doc_sent.get(node.nodeid) == record:
+                record = {"nodeid": node.nodeid}
+            else:
+                session.doc_sent[node.nodeid] = record
+            parents.append(record)
+        node = node.parent
+    parents.reverse()
+
+    test = item._doccol.to_record()
+    test.update(
+        nodeid=item.nodeid,
+        name=item.name,
+        doc=item.obj.__doc__,
+        source_file=str(item.fspath),
+        source_obj=item._doccol.source_obj,
+        location=item.location[0],
+        index=session.doc_order.get(item._doccol, 0),
+        stages=getattr(item, "_doc_stages", []),
+    )
+    return {"parents": parents, "test": test}
+
+
+def _merge_doc_record(session, record):
+    """
+    Add a test's doc record (from an xdist worker, or a result store) to the doc collector tree.
+
+    :return: The module node ID and module doc collector that the test belongs to, and the test's
+        doc collector.
+    """
+    settings = session.doc_settings
+    parent = None
+    for node_record in record["parents"]:
+        nodeid = node_record["nodeid"]
+        doccol = session.doc_index.get(nodeid)
+        if doccol is None:
+            doccol = _parent_doccol(
+                settings, node_record["name"], node_record["doc"], nodeid, node_record["level"]
             )
+            session.doc_index[nodeid] = doccol
+            if parent is None:
+                session.doc_collectors.append(doccol)
+            else:
+                parent.add_child(doccol)
+        doccol.update_from_record(node_record)
+        parent = doccol
+
+    test = record["test"]
+    test_doccol = _function_doccol(
+        settings,
+        test["name"],
+        test["doc"],
+        test["nodeid"],
+        test["source_file"],
+        test["source_obj"],
+        test["location"],
+    )
+    test_doccol.update_from_record(
+        test,
+        session.failure_logs.get("{}.failures".format(test_doccol.log_location)),
+        session.log_budget,
+    )
+    parent.add_child(test_doccol)
+    session.doc_order[test_doccol] = test["index"]
+
+    module_nodeid = record["parents"][0]["nodeid"]
+    return module_nodeid, session.doc_index[module_nodeid], test_doccol
+
+
+def _sort_children(doc_collector, order):
+    """
+    Put a doc collector's children (recursively) back into collection order, as results
+    from xdist workers arrive in whatever order the tests finished.
+
+    :param dict order: Collection index of each test doc collector
+    :return: The collection index of the first test under this collector
+    """
+    if not doc_collector.children:
+        return order.get(doc_collector, 0)
+    keyed = [(_sort_children(child, order), child) for child in doc_collector.children]
+    keyed.sort(key=lambda pair: pair[0])
+    doc_collector.children = [child for _, child in keyed]
+    return keyed[0][0]
+
+
+def _new_run_id():
+    return datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+
+def _result_counts(results):
+    """
+    Count the tests in overview results, and how many of them passed every stage.
+    """
+    failed = sum(
+        1
+        for x in results
+        if any(x.get(when) != "|passed|" for when in ("setup", "call", "teardown"))
+    )
+    return {"tests": len(results), "passed": len(results) - failed, "failed": failed}
+
+
+OVERVIEW_FORMATS = ["simple", "list-table", "csv-table"]
+
+
+def _overview_rows(results):
+    for x in results:
+        yield (x["name"], x["setup"], x.get("call", "NOTRUN"), x.get("teardown", "NOTRUN"))
+
+
+def _csv_row(row):
+    return ", ".join('"{}"'.format(cell.replace('"', '""')) for cell in row)
+
+
+# Terminal color codes and hyperlinks, which take up no width when a table is laid out.
+_INVISIBLE_RE = re.compile(r"\x1b\[\d*(?:;\d*)*m|\x1b\]8;.*?;.*?\x1b\\")
+
+
+def _display_width(text):
+    """
+    Width of a table cell, as tabulate measures it (without wide character support).
+    """
+    return len(_INVISIBLE_RE.sub("", text))
+
+
+def _simple_row(row, widths):
+    cells = (cell + " " * (width - _display_width(cell)) for cell, width in zip(row, widths))
+    return "  ".join(cells).rstrip() + "\n"
+
 
-        # Writes the Overview.rst file.
-        overview_path = os.path.join(session.config.getoption("rst_dir"), "overview.rst")
-        if os.path.exists(overview_path):
-            # Append to existing overview.
-            with open(overview_path, "r") as existing_overview:
-                overview_data = [x.rstrip() for x in existing_overview.readlines()]
+def write_overview_table(f, results, fmt="simple"):
+    """
+    Write overview results to an open file as an RST table, a row at a time.
+
+    :param str fmt: ``simple`` for a simple table, laid out the same as ``tabulate`` does it,
+        or ``list-table`` or ``csv-table`` for those directives, which docutils parses much
+        faster than a big table. Only the directives are written in a single pass over the
+        results: a simple table needs every row's width before its first line is written.
+    """
+    if fmt == "list-table" and results:
+        f.write(".. list-table::\n   :header-rows: 1\n\n")
+        for row in itertools.chain([RESULTS_HEADER], _overview_rows(results)):
+            f.write("   * - {}\n".format(row[0]))
+            for cell in row[1:]:
+                f.write("     - {}\n".format(cell))
+    elif fmt == "csv-table" and results:
+        f.write(".. csv-table::\n   :header: {}\n\n".format(_csv_row(RESULTS_HEADER)))
+        for row in _overview_rows(results):
+            f.write("   {}\n".format(_csv_row(row)))
+    else:
+        # A pass over the results for the column widths, then another to write the rows, so
+        # the rows aren't all held at once. Headers get two spaces of padding, as with tabulate.
+        widths = [_display_width(header) + 2 for header in RESULTS_HEADER]
+        for row in _overview_rows(results):
+            widths = [max(width, _display_width(cell)) for width, cell in zip(widths, row)]
+        border = "  ".join("=" * width for width in widths) + "\n"
+        f.write(border)
+        f.write(_simple_row(RESULTS_HEADER, widths))
+        f.write(border)
+        for row in _overview_rows(results):
+            f.write(_simple_row(row, widths))
+        f.write(border)
+
+
+def _rst_title(title, level="title"):
+    """
+    :param str level: The RstCloth heading to write the title as: ``title``, ``h1``, ``h2``...
+    """
+    rst = RstCloth()
+    getattr(rst, level)(title)
+    rst.newline()
+    return "\n".join(rst.data) + "\n"
+
+
+class OverviewStore(object):
+    """
+    The overview of every run written into the RST directory: a table of results per run ID,
+    under a heading naming it.
+
+    An index of the runs, with where each run's table is in overview.rst, is kept alongside. A
+    new run's table is appended to overview.rst without reading back those of earlier runs. The
+    file is only rewritten to drop runs: those beyond ``keep_runs``, or an earlier write of the
+    same run ID.
+
+    With ``pages``, each run's table gets a page of its own under overview/ instead, and
+    overview.rst is a short index of the runs. With a ``page_size``, a run's table is split
+    into pages of that many rows under overview/, and a toctree of them takes its place.
+
+    An overview.rst the index doesn't account for (written without it, in the other mode, or
+    changed since) is kept as it is, ahead of the runs written from then on.
+    """
+
+    INDEX = ".docgen-overview.json"
+    TITLE = "Test Result Table(s)"
+    PAGE_DIR = "overview"
+
+    def __init__(self, rst_dir, keep_runs=0, pages=False, fmt="simple", page_size=0):
+        self.rst_dir = rst_dir
+        self.keep_runs = keep_runs
+        self.pages = pages
+        self.fmt = fmt
+        self.page_size = page_size
+        self.filename = os.path.join(rst_dir, "overview.rst")
+        self.index_filename = os.path.join(rst_dir, self.INDEX)
+        try:
+            with open(self.index_filename, "r") as f:
+                index = json.load(f)
+        except (IOError, ValueError):
+            index = {}
+        self.runs = index.get("runs", [])
+        # Bytes at the start of overview.rst that are kept ahead of the index of pages.
+        self.kept = index.get("kept", 0)
+        if index.get("pages", False) != pages or index.get("size") != self._size():
+            # overview.rst was written without the index, or changed since. It's kept as it is,
+            # but the runs in it can no longer be told apart.
+            self.runs = []
+            self.kept = self._size() or 0
+
+    def _size(self):
+        if os.path.exists(self.filename):
+            return os.path.getsize(self.filename)
+        return None
+
+    def _page(self, name):
+        return os.path.join(self.rst_dir, self.PAGE_DIR, name + ".rst")
+
+    def add_run(self, run_id, results):
+        """
+        Add a run's results to the overview.
 
-                result_rst = RstCloth()
-                result_rst._data = overview_data
+        :param str run_id: ID of the run. Replaces an earlier run with the same ID.
+        :param list results: The overview results of every test in the run
+        """
+        run = dict(_result_counts(results), run_id=run_id, page=re.sub(r"[^\w.-]", "_", run_id))
+        dropped = [x for x in self.runs if x["run_id"] == run_id]
+        kept = [x for x in self.runs if x["run_id"] != run_id]
+        if self.keep_runs and len(kept) >= self.keep_runs:
+            dropped.extend(kept[: len(kept) - self.keep_runs + 1])
+            kept = kept[len(kept) - self.keep_runs + 1 :]
+        for old in dropped:
+            for part in range(1, old.get("parts", 0) + 1):
+                self._remove_page("{}-{}".format(old["page"], part))
+        if self.pages:
+            self._write_page(run, results, dropped, kept)
         else:
-            result_rst = RstCloth()
-            result_rst.title("Test Result Table(s)")
-            result_rst.newline()
+            self._append(run, results, dropped)
+        self.runs = kept + [run]
+        _write_text(
+            self.index_filename,
+            json.dumps(
+                {"pages": self.pages, "size": self._size(), "kept": self.kept, "runs": self.runs},
+                indent=1,
+            ),
+        )
 
-        result_rst._add(
+    def _remove_page(self, name):
+        if os.path.exists(self._page(name)):
+            os.remove(self._page(name))
+
+    def _write_results(self, f, run, results):
+        """
+        Write a run's results: its table, or a toctree of the pages the table is split into.
+        Followed by two blank lines, as when adding the table and two newlines to an RstCloth
+        document.
+        """
+        run["parts"] = 0
+        if not self.page_size or len(results) <= self.page_size:
+            write_overview_table(f, results, self.fmt)
+            f.write("\n\n")
+            return
+        f.write(".. toctree::\n   :maxdepth: 1\n\n")
+        for start in range(0, len(results), self.page_size):
+            run["parts"] += 1
+            name = "{}-{}".format(run["page"], run["parts"])
+            os.makedirs(os.path.join(self.rst_dir, self.PAGE_DIR), exist_ok=True)
+            with open(self._page(name), "w") as page:
+                page.write(
+                    _rst_title(
+                        "Test Results: {} ({}-{})".format(
+                            run["run_id"], start + 1, min(start + self.page_size, len(results))
+                        )
+                    )
+                )
+                self._write_results(page, {}, results[start : start + self.page_size])
+            f.write("   /{}/{}\n".format(self.PAGE_DIR, name))
+        f.write("\n\n")
+
+    def _append(self, run, results, dropped):
+        if dropped:
+            self._cut(dropped)
+        if not os.path.exists(self.filename):
+            _write_text(self.filename, _rst_title(self.TITLE))
+        with open(self.filename, "a") as f:
+            run["offset"] = f.tell()
+            f.write(_rst_title("Run: {}".format(_rst_escape(run["run_id"])), "h1"))
+            self._write_results(f, run, results)
+            run["length"] = f.tell() - run["offset"]
+
+    def _cut(self, dropped):
+        """
+        Rewrite overview.rst without the tables of the ``dropped`` runs.
+        """
+        dropped_ids = set(x["run_id"] for x in dropped)
+        with open(self.filename, "rb") as f:
+            data = f.read()
+        kept = []
+        position = 0
+        shift = 0
+        for run in sorted(self.runs, key=lambda x: x["offset"]):
+            if run["run_id"] in dropped_ids:
+                kept.append(data[position : run["offset"]])
+                position = run["offset"] + run["length"]
+                shift += run["length"]
+            else:
+                run["offset"] -= shift
+        kept.append(data[position:])
+        with open(self.filename, "wb") as f:
+            f.write(b"".join(kept))
+
+    def _write_page(self, run, results, dropped, kept):
+        for old in dropped:
+            self._remove_page(old["page"])
+        os.makedirs(os.path.join(self.rst_dir, self.PAGE_DIR), exist_ok=True)
+        with open(self._page(run["page"]), "w") as f:
+            f.write(_rst_title("Test Results: {}".format(run["run_id"])))
+            self._write_results(f, run, results)
+
+        # Newest first
+        runs = [run] + kept[::-1]
+        index = RstCloth()
+        if self.kept:
+            with open(self.filename, "rb") as f:
+                index._add(f.read(self.kept).decode("utf-8"))
+        else:
+            index.title(self.TITLE)
+            index.newline()
+        index.directive(name="toctree", fields=[("hidden", "")])
+        index.newline()
+        index.content(["{}/{}".format(self.PAGE_DIR, x["page"]) for x in runs], 3)
+        index.newline()
+        index._add(
             tabulate(
                 [
-                    (x["name"], x["setup"], x.get("call", "NOTRUN"), x.get("teardown", "NOTRUN"))
-                    for x in results
+                    (
+                        ":doc:`{} <{}/{}>`".format(x["run_id"], self.PAGE_DIR, x["page"]),
+                        x["tests"],
+                        x["passed"],
+                        x["failed"],
+                    )
+                    for x in runs
                 ],
-                headers=RESULTS_HEADER,
+                headers=["Run", "Tests", "Passed", "Failed"],
                 tablefmt="rst",
             )
         )
-        result_rst.newline(2)
-        result_rst.write(os.path.join(session.config.getoption("rst_dir"), "overview.rst"))
+        index.newline(2)
+        index.write(self.filename)
 
-        # Todo: Write a test log data rst.
-        # Theoretically, this should let us put it as an appendix in Latext. Having it generate
-        # single RST files like overview & logdata will allow users (aka me) to customize how the generated TOC
-        # and such is done.
 
+# Result store (--rst-store):
+#
+# Every finished test is appended to the store as the same doc record that xdist workers send to
+# the controller, plus the range of its captured output in the module's log. Replaying the records
+# in order rebuilds the doc collector tree, without running the tests again.
 
-def pytest_addoption(parser):
+RESULT_STORE_FILENAMES = {"jsonl": "results.jsonl", "sqlite": "results.sqlite"}
+
+
+class JsonlResultStore(object):
     """
-    Add in options for generating docs.
+    Result records, one JSON object per line, after a first line with the run ID.
 
+    Each line is flushed as it's written: a record is a whole test, and the lines already
+    written are all there if the run crashes, not just those that filled the file's buffer.
     """
-    group = parser.getgroup("RST Writer", description="RST documentation generator options")
-    group.addoption(
+
+    def __init__(self, filename, run_id):
+        self.filename = filename
+        self._file = open(filename, "w")
+        self._file.write(json.dumps({"run_id": run_id}) + "\n")
+        self._file.flush()
+
+    def append(self, record):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    @staticmethod
+    def read(filename):
+        with open(filename, "r") as f:
+            next(f, None)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    @staticmethod
+    def read_run_id(filename):
+        with open(filename, "r") as f:
+            return json.loads(f.readline()).get("run_id")
+
+
+class SqliteResultStore(object):
+    """
+    Result records in a SQLite database. Alongside each record, the outcome of each stage and the
+    total duration of the test get their own columns, so they can be queried directly.
+
+    Records are committed every ``COMMIT_EVERY`` records, so the journal doesn't grow with the
+    whole run, and most of a crashed run's records are still there.
+    """
+
+    COMMIT_EVERY = 1000
+
+    SCHEMA = (
+        "CREATE TABLE results (id INTEGER PRIMARY KEY, nodeid TEXT, module TEXT, setup TEXT, "
+        "call TEXT, teardown TEXT, duration REAL, record TEXT)"
+    )
+
+    def __init__(self, filename, run_id):
+        self.filename = filename
+        self._db = sqlite3.connect(filename)
+        self._db.execute("DROP TABLE IF EXISTS results")
+        self._db.execute("DROP TABLE IF EXISTS run")
+        self._db.execute(self.SCHEMA)
+        self._db.execute("CREATE TABLE run (run_id TEXT)")
+        self._db.execute("INSERT INTO run (run_id) VALUES (?)", (run_id,))
+        self._db.commit()
+        self._pending = 0
+
+    def append(self, record):
+        test = record["test"]
+        outcomes = {when: outcome for when, outcome, duration in test["stages"]}
+        self._db.execute(
+            "INSERT INTO results (nodeid, module, setup, call, teardown, duration, record) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                test["nodeid"],
+                _module_nodeid(test["nodeid"]),
+                outcomes.get("setup"),
+                outcomes.get("call"),
+                outcomes.get("teardown"),
+                sum(duration for when, outcome, duration in test["stages"]),
+                json.dumps(record, separators=(",", ":")),
+            ),
+        )
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self._db.commit()
+            self._pending = 0
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+    @staticmethod
+    def read(filename):
+        db = sqlite3.connect(filename)
+        try:
+            for (record,) in db.execute("SELECT record FROM results ORDER BY id"):
+                yield json.loads(record)
+        finally:
+            db.close()
+
+    @staticmethod
+    def read_run_id(filename):
+        db = sqlite3.connect(filename)
+        try:
+            return db.execute("SELECT run_id FROM run").fetchone()[0]
+        finally:
+            db.close()
+
+
+RESULT_STORES = {"jsonl": JsonlResultStore, "sqlite": SqliteResultStore}
+
+
+def _result_store_type(filename):
+    if filename.endswith(RESULT_STORE_FILENAMES["sqlite"]):
+        return SqliteResultStore
+    return JsonlResultStore
+
+
+def read_result_store(filename):
+    """
+    Iterate over the records saved in a result store, in the order they were written.
+    """
+    return _result_store_type(filename).read(filename)
+
+
+def read_result_store_run_id(filename):
+    """
+    Return the ID of the run saved in a result store.
+    """
+    return _result_store_type(filename).read_run_id(filename)
+
+
+def _store_record(session, record, doc_collector):
+    """
+    Append a finished test's doc record to the result store.
+    """
+    record["test"]["capture"] = [doc_collector.capture_start, doc_collector.capture_end]
+    if session.doc_settings.log_compress:
+        record["test"]["capture_compressed"] = True
+    session.doc_store.append(record)
+
+
+def find_result_store(location):
+    """
+    :param str location: A result store, or the directory holding one.
+    :return: Filename of the result store.
+    """
+    if not os.path.isdir(location):
+        return location
+    for filename in RESULT_STORE_FILENAMES.values():
+        store = os.path.join(location, filename)
+        if os.path.exists(store):
+            return store
+    raise IOError("No result store in {}".format(location))
+
+
+class RenderSession(object):
+    """
+    Stands in for the pytest session when rendering from a result store, holding the same
+    doc state.
+    """
+
+
+def _copy_tree(src, dst):
+    """
+    Copy the files under ``src`` into ``dst``, which may already exist.
+    """
+    for dirpath, _, filenames in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(dirpath, src))
+        os.makedirs(target, exist_ok=True)
+        for name in filenames:
+            shutil.copy2(os.path.join(dirpath, name), os.path.join(target, name))
+
+
+def render_result_store(filename, settings):
+    """
+    Write the RST documents for a run saved with ``--rst-store``, without running its tests
+    again. The run's results replace those of the same run ID in the overview.
+
+    :param str filename: The result store
+    :param DocgenSettings settings: How to render the documents
+    """
+    session = RenderSession()
+    _start_session(session, settings)
+    # Results from xdist runs were stored in the order the tests finished.
+    session.doc_reorder = True
+
+    # The documents reference the captured output logs, which were written next to the store.
+    logs = os.path.join(os.path.dirname(os.path.abspath(filename)), "logs")
+    rst_logs = os.path.join(os.path.abspath(settings.rst_dir), "logs")
+    if os.path.isdir(logs) and logs != rst_logs:
+        _copy_tree(logs, rst_logs)
+
+    # The captured output is wherever the run wrote it, whatever the options.
+    settings.log_compress = False
+    for record in read_result_store(filename):
+        _, _, test_doccol = _merge_doc_record(session, record)
+        test_doccol.capture_start, test_doccol.capture_end = record["test"]["capture"]
+        if record["test"].get("capture_compressed"):
+            # The run wrote its captured output to log stores, so the documents include it
+            # from them.
+            settings.log_compress = True
+    _write_session(session)
+
+
+def _write_session(session):
+    """
+    Write out the index, every document not already written, and the overview.
+    """
+    settings = session.doc_settings
+    # Flush out any captured output before the documents reference it.
+    session.capture_logs.close()
+    _close_log_archives(session)
+    if session.doc_store is not None:
+        session.doc_store.close()
+    if settings.xdist_worker:
+        # Everything has been sent on to the controller.
+        return
+    if session.doc_reorder:
+        session.doc_collectors.sort(
+            key=lambda doc_collector: _sort_children(doc_collector, session.doc_order)
+        )
+
+    if settings.write_index:
+        index = RstCloth()
+        index.title(settings.title)
+        index.newline()
+        index.content(settings.desc)
+        index.newline()
+        index.directive(name="toctree", fields=[("includehidden", ""), ("glob", "")])
+        index.newline()
+        index.content(["*"], 3)
+        index.newline(2)
+        _write_rst(session, index, os.path.join(settings.rst_dir, "index.rst"))
+
+    # In streaming mode, finished modules have already been written out, and only their
+    # results are left. Anything else (or everything, when not streaming) is written now.
+    results = session.doc_results
+    results.extend(_write_modules(session, getattr(session, "doc_collectors", [])))
+    session.failure_logs.close()
+
+    # Writes the Overview.rst file.
+    overview = OverviewStore(
+        settings.rst_dir,
+        keep_runs=settings.keep_runs,
+        pages=settings.overview_pages,
+        fmt=settings.overview_format,
+        page_size=settings.overview_page_size,
+    )
+    overview.add_run(settings.run_id, results)
+    if session.doc_failure_digest is not None:
+        _write_rst(
+            session,
+            session.doc_failure_digest.build(),
+            os.path.join(settings.rst_dir, "failures.rst"),
+        )
+    if session.doc_manifest is not None:
+        session.doc_manifest.save()
+
+    # Todo: Write a test log data rst.
+    # Theoretically, this should let us put it as an appendix in Latext. Having it generate
+    # single RST files like overview & logdata will allow users (aka me) to customize how the generated TOC
+    # and such is done.
+
+
+class DocgenSettings(object):
+    """
+    The docgen command line options, resolved once when pytest is configured rather than looked
+    up on every hook call.
+    """
+
+    def __init__(self, getoption, xdist_worker=False):
+        """
+        :param getoption: Looks up an option by its ``dest``, like ``config.getoption``.
+        :param bool xdist_worker: Whether this is an xdist worker.
+        """
+        self.rst_dir = getoption("rst_dir")
+        self.write_index = getoption("rst_write_index")
+        self.title = getoption("rst_title", "Test Results")
+        self.desc = getoption("rst_desc", "")
+        self.fixture_results = getoption("rst_fixture_results", False)
+        self.label_prefix = getoption("rst_label_prefix")
+        self.stream = getoption("rst_stream", False)
+        self.workers = getoption("rst_workers")
+        self.incremental = getoption("rst_incremental")
+        self.profile = getoption("rst_profile", False)
+        self.failure_budget = int(getoption("rst_failure_budget") * 1024 * 1024)
+        self.failure_digest = getoption("rst_failure_digest")
+        self.store = getoption("rst_store", None)
+        self.build_order = _parse_build_order(getoption("rst_build_order"))
+        self.run_id = getoption("rst_run_id") or _new_run_id()
+        self.keep_runs = getoption("rst_keep_runs")
+        self.overview_pages = getoption("rst_overview_pages")
+        self.overview_format = getoption("rst_overview_format")
+        self.overview_page_size = getoption("rst_overview_page_size")
+        self.aggregate_params = getoption("rst_aggregate_params", False)
+        self.shard_tests = getoption("rst_shard_tests", 0)
+        self.shard_size = int(getoption("rst_shard_size", 0) * 1024)
+        self.source_mode = getoption("rst_source_mode", "pyobject")
+        self.log_mode = getoption("rst_log_mode", "inline")
+        self.log_test_bytes = int(getoption("rst_log_test_bytes", 0) * 1024)
+        self.log_test_lines = getoption("rst_log_test_lines", 0)
+        self.log_session_bytes = int(getoption("rst_log_session_bytes", 0) * 1024 * 1024)
+        self.log_session_lines = getoption("rst_log_session_lines", 0)
+        self.log_keep_lines = getoption("rst_log_keep_lines", 50)
+        self.log_archive = getoption("rst_log_archive", False)
+        # Lazy logs are loaded from log stores, so the captured output is written to one too,
+        # rather than to a plain text log that would then be copied into one.
+        self.log_compress = getoption("rst_log_compress", False) or self.log_mode == "lazy"
+        cut_dir = getoption("rst_cut_dir")
+        self.cut_dir_re = re.compile(r"^{}[.\\/]".format(cut_dir)) if cut_dir else None
+        self.xdist_worker = xdist_worker
+        # xdist registers its controller plugin after this is created; see pytest_sessionstart.
+        self.xdist_controller = False
+
+
+def _parse_build_order(value):
+    """
+    Parse ``--rst-build-order``: a comma separated list of the built-in sections.
+    """
+    if not value:
+        return DEFAULT_BUILD_ORDER
+    build_order = [section.strip() for section in value.split(",") if section.strip()]
+    unknown = [section for section in build_order if section not in BUILD_SECTION_NAMES]
+    if unknown:
+        raise ValueError(
+            "Unknown section(s) in build order: {}. Choose from: {}".format(
+                ", ".join(unknown), ", ".join(DEFAULT_BUILD_ORDER)
+            )
+        )
+    return build_order
+
+
+def _config_settings(config):
+    """
+    The docgen settings of a pytest config: the plugin's, if it's registered, or else resolved
+    from the config's options.
+    """
+    plugin = config.pluginmanager.get_plugin("docgen")
+    if plugin is not None:
+        return plugin.settings
+    return DocgenSettings(config.getoption, xdist_worker=_is_xdist_worker(config))
+
+
+class DocgenPlugin(object):
+    """
+    The docgen hooks. Only registered when ``--rst-dir`` is given, so that pytest runs without
+    it don't pay for them.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.session = None
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_collection_modifyitems(self, session, config, items):
+        """
+        Add NodeDocCollectors to each level of test collectors:
+
+            * Function
+            * Class
+            * Module
+            * Session (note: session keeps track of the sub-collectors for output at end of
+            test session)
+        """
+        yield
+        settings = self.settings
+        count_pending = settings.stream and not settings.xdist_worker
+        with _timer(session, "pytest_collection_modifyitems"):
+            # Note: we shouldn't need to modify the item list, but we should
+            # run *after* list has been pared down.
+            for index, test in enumerate(items):
+                # TBD: not completely sure if this is correct call
+                if test.cls:
+                    prefix = test.cls.__name__ + "."
+                else:
+                    prefix = ""
+                test_doccol = _function_doccol(
+                    settings,
+                    test.name,
+                    test.obj.__doc__,
+                    test.nodeid,
+                    str(test.fspath),
+                    "{}{}".format(prefix, test.obj.__name__),
+                    test.location[0],
+                )
+                session.doc_order[test_doccol] = index
+                test._doccol = test_doccol
+                doccollect_parent(test)
+                if count_pending:
+                    session.doc_pending[_module_nodeid(test.nodeid)] += 1
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_fixture_setup(self, fixturedef, request):
+        """
+        We can use this pytest hook to add in fixture doc info into each
+        NodeDocCollector
+        """
+        outcome = yield
+        with _timer(request.session, "pytest_fixture_setup"):
+            if self.settings.fixture_results or getattr(fixturedef.func, "_doc_result", False):
+                # Note: force the result to be a string. We don't want to be keeping around possibly very large
+                # objects that might be returned by fixtures. Also it ensures that we capture the state of the fixture
+                # *now* after setup is done, rather than what it might be at the time of the doc generation (end of test run)
+                try:
+                    doccol = request.node._doccol
+                    doccol.add_fixture(fixturedef, request.param_index, outcome.get_result())
+                except Exception as exc:
+                    # TODO: Ignoring exceptions for now, but we should probably handle
+                    #  them more gracefully.
+                    pass
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item, call):
+        """
+        Add in test results to doc collectors.
+        """
+        outcome = yield
+        with _timer(item.session, "pytest_runtest_makereport"):
+            res = outcome.get_result()
+            doccol = item._doccol
+            failure_log = None
+            if res.outcome != "passed" and not self.settings.xdist_worker:
+                failure_log = item.session.failure_logs.get(
+                    "{}.failures".format(doccol.log_location)
+                )
+            doccol.add_result(res, failure_log)
+            doccol.add_logdata(
+                _take_logdata(item, res.when), res.when, log_budget=item.session.log_budget
+            )
+            if self.settings.store:
+                if res.when == "setup":
+                    item._doc_stages = []
+                item._doc_stages.append([res.when, res.outcome, res.duration])
+            if res.when == "teardown":
+                if self.settings.xdist_worker:
+                    # The controller writes the documents (and the captured output, which it gets
+                    # from the report itself), so hand everything over with the final report.
+                    res.docgen = _doc_record(item)
+                    doccol.release()
+                else:
+                    capture_log = item.session.capture_logs.get(
+                        "{}.log".format(doccol.log_location)
+                    )
+                    with _timer(item.session, "add_capture"):
+                        doccol.add_capture(
+                            capstdout=res.capstdout,
+                            capstderr=res.capstderr,
+                            capture_log=capture_log,
+                            log_budget=item.session.log_budget,
+                        )
+                    if item.session.doc_store is not None:
+                        _store_record(item.session, _doc_record(item), doccol)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        """
+        In streaming mode, write out a module as soon as the last of its tests has finished
+        (including teardown of its module-scoped fixtures).
+        """
+        yield
+        if self.settings.xdist_worker or not hasattr(item, "_doccol"):
+            return
+        with _timer(item.session, "pytest_runtest_protocol"):
+            module = item.getparent(pytest.Module)
+            _test_finished(item.session, module.nodeid, module._doccol)
+
+    def pytest_runtest_logreport(self, report):
+        """
+        On the xdist controller, add doc records sent with worker reports to the doc collector
+        tree.
+        """
+        record = getattr(report, "docgen", None)
+        # xdist sets the worker node on reports it receives; reports made locally don't have one.
+        if record is None or getattr(report, "node", None) is None:
+            return
+        if not self.settings.xdist_controller:
+            return
+        session = self.session
+        with _timer(session, "pytest_runtest_logreport"):
+            module_nodeid, doc_collector, test_doccol = _merge_doc_record(session, record)
+            capture_log = session.capture_logs.get("{}.log".format(test_doccol.log_location))
+            with _timer(session, "add_capture"):
+                test_doccol.add_capture(
+                    capstdout=report.capstdout,
+                    capstderr=report.capstderr,
+                    capture_log=capture_log,
+                    log_budget=session.log_budget,
+                )
+            if session.doc_store is not None:
+                _store_record(session, record, test_doccol)
+            _test_finished(session, module_nodeid, doc_collector)
+        if module_nodeid not in session.doc_pending and self.settings.stream:
+            # Module has been written out; its parents are no longer needed either.
+            for nodeid in list(session.doc_index):
+                if _module_nodeid(nodeid) == module_nodeid:
+                    del session.doc_index[nodeid]
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_xdist_node_collection_finished(self, node, ids):
+        """
+        Count the tests in each module on the xdist controller, for streaming mode. Every worker
+        collects the same tests, so only the first collection is counted.
+        """
+        session = self.session
+        if self.settings.stream and not session.doc_pending_counted:
+            session.doc_pending_counted = True
+            for nodeid in ids:
+                session.doc_pending[_module_nodeid(nodeid)] += 1
+
+    def pytest_sessionstart(self, session):
+        """
+        Used to keep track of all doc collectors.
+        """
+        self.settings.xdist_controller = _is_xdist_controller(session.config)
+        self.session = session
+        _start_session(session, self.settings)
+        # Test results from xdist workers arrive in whatever order the tests finished.
+        session.doc_reorder = self.settings.xdist_controller
+
+    def pytest_sessionfinish(self, session):
+        """
+        Write out results for each doc collector.
+        """
+        with _timer(session, "pytest_sessionfinish"):
+            _write_session(session)
+        if session.doc_profile is not None:
+            # xdist workers save their own profile alongside the controller's.
+            worker = getattr(session.config, "workerinput", {}).get("workerid")
+            session.doc_profile.write(
+                os.path.join(
+                    self.settings.rst_dir,
+                    "docgen-profile-{}.json".format(worker) if worker else "docgen-profile.json",
+                )
+            )
+
+    def pytest_terminal_summary(self, terminalreporter, exitstatus, config):
+        """
+        Print the ``--rst-profile`` timings.
+        """
+        if self.session is None or self.session.doc_profile is None:
+            return
+        terminalreporter.write_sep("-", "docgen profile")
+        terminalreporter.write_line(
+            "{:<32} {:>8} {:>10} {:>10} {:>10} {:>10}".format(
+                "", "calls", "total (s)", "mean (ms)", "p99 (ms)", "max (ms)"
+            )
+        )
+        for row in self.session.doc_profile.summary():
+            terminalreporter.write_line(
+                "{:<32} {:>8} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}".format(
+                    row["name"],
+                    row["calls"],
+                    row["total"],
+                    row["mean"] * 1000,
+                    row["p99"] * 1000,
+                    row["max"] * 1000,
+                )
+            )
+
+
+def _start_session(session, settings):
+    """
+    Set up the doc state on a session.
+    """
+    session.doc_settings = settings
+    session.doc_reorder = False
+    session.doc_collectors = []
+    session.doc_collector_ids = set()
+    session.doc_results = []
+    session.doc_pending = Counter()
+    session.doc_pending_counted = False
+    # Collection index of each test doc collector
+    session.doc_order = {}
+    # xdist: parent doc collectors on the controller, and records already sent by a worker.
+    session.doc_index = {}
+    session.doc_sent = {}
+    session.doc_manifest = None
+    if settings.incremental:
+        session.doc_manifest = DocManifest(settings.rst_dir)
+    session.capture_logs = CaptureLogs(session.doc_manifest, settings.log_compress)
+    session.failure_logs = FailureLogs(settings.failure_budget)
+    # The controller fits the logs from xdist workers into the budget, as it gets them.
+    session.log_budget = None if settings.xdist_worker else _log_budget(settings)
+    session.doc_failure_digest = FailureDigest() if settings.failure_digest else None
+    session.doc_store = None
+    if settings.store and not settings.xdist_worker:
+        os.makedirs(settings.rst_dir, exist_ok=True)
+        session.doc_store = RESULT_STORES[settings.store](
+            os.path.join(settings.rst_dir, RESULT_STORE_FILENAMES[settings.store]), settings.run_id
+        )
+    session.doc_profile = DocgenProfile() if settings.profile else None
+
+
+def add_render_options(addoption):
+    """
+    Add the options that change how the documents are rendered. These are shared by the pytest
+    plugin and ``python -m pytest_docgen render``.
+
+    :param addoption: ``addoption`` of a pytest option group, or ``add_argument`` of an argparse
+        parser.
+    """
+    addoption(
         "--rst-write-index",
         help="Write an RST index.rst file",
         action="store_true",
         default=False,
         dest="rst_write_index",
     )
-    group.addoption(
+    addoption(
         "--rst-title",
         help="RST Document Title. Only takes effect if writing an index.rst",
         default="Test Documentation",
         dest="rst_title",
     )
-    group.addoption(
+    addoption(
         "--rst-desc", help="RST Document description", dest="rst_desc", default="Test case results"
     )
+    addoption("--rst-cut-dir", dest="rst_cut_dir", help="Trim document node names", action="store")
+    addoption(
+        "--rst-label-prefix",
+        dest="rst_label_prefix",
+        help="Text to prepend to generated test labels",
+        action="store",
+        default="",
+    )
+    addoption(
+        "--rst-build-order",
+        dest="rst_build_order",
+        help="Comma separated order of the sections written for each test, out of {}. Sections "
+        "left out are not written".format(",".join(DEFAULT_BUILD_ORDER)),
+        default=None,
+    )
+    addoption(
+        "--rst-run-id",
+        dest="rst_run_id",
+        help="ID of the run in the overview, which has a table of results for each run written "
+        "into the RST directory. A run with the same ID as an earlier one replaces its table "
+        "(default: the time the run started)",
+        default=None,
+    )
+    addoption(
+        "--rst-keep-runs",
+        dest="rst_keep_runs",
+        help="Number of runs to keep in the overview, dropping the oldest (default: keep all)",
+        type=int,
+        default=0,
+    )
+    addoption(
+        "--rst-overview-pages",
+        dest="rst_overview_pages",
+        help="Write each run's results table to a page of its own, under overview/ in the RST "
+        "directory, with overview.rst listing the runs",
+        action="store_true",
+        default=False,
+    )
+    addoption(
+        "--rst-aggregate-params",
+        dest="rst_aggregate_params",
+        help="Write the cases of each parametrized test together: the docstring and source once, "
+        "with a table of every case's outcomes. Only failed cases are written out in full",
+        action="store_true",
+        default=False,
+    )
+    addoption(
+        "--rst-source-mode",
+        dest="rst_source_mode",
+        help="How the source of each test is written: a literalinclude that Sphinx finds the test "
+        "in (pyobject), a literalinclude of the test's lines (lines), or the source itself "
+        "(inline). The latter two find every test in a file with one parse of the file, rather "
+        "than Sphinx parsing it again for each test",
+        choices=SOURCE_MODES,
+        default="pyobject",
+    )
+    addoption(
+        "--rst-log-mode",
+        dest="rst_log_mode",
+        help="How each test's logs and captured output are written: into the document (inline), "
+        "or to compressed log stores per test file, which the pytest_docgen.sphinxext.lazy_log "
+        "extension only loads a test's logs from when they're expanded (lazy). Lazy mode implies "
+        "--rst-log-compress",
+        choices=LOG_MODES,
+        default="inline",
+    )
+    addoption(
+        "--rst-shard-tests",
+        dest="rst_shard_tests",
+        help="Split the document of a module with more tests than this into pages of up to this "
+        "many tests, so that Sphinx can read them in parallel. Classes are kept whole",
+        type=int,
+        default=0,
+    )
+    addoption(
+        "--rst-shard-size",
+        dest="rst_shard_size",
+        help="Split the document of a module bigger than this many KB into pages of up to this "
+        "size. Classes are kept whole",
+        type=float,
+        default=0,
+    )
+    addoption(
+        "--rst-overview-format",
+        dest="rst_overview_format",
+        help="Format of the overview's results tables: a simple table, or a list-table or "
+        "csv-table directive, which are much faster for docutils to parse with many tests",
+        choices=OVERVIEW_FORMATS,
+        default="simple",
+    )
+    addoption(
+        "--rst-overview-page-size",
+        dest="rst_overview_page_size",
+        help="Split a run's results table into pages of this many tests, under overview/ in the "
+        "RST directory (default: a single table)",
+        type=int,
+        default=0,
+    )
+    addoption(
+        "--rst-workers",
+        dest="rst_workers",
+        help="Number of processes used to render and write the RST documents at the end of the "
+        "session",
+        type=int,
+        default=1,
+    )
+    addoption(
+        "--rst-incremental",
+        dest="rst_incremental",
+        help="Only replace generated files whose content has changed since the last run, as "
+        "recorded in a manifest in the RST directory",
+        action="store_true",
+        default=False,
+    )
+    addoption(
+        "--rst-failure-budget",
+        dest="rst_failure_budget",
+        help="Megabytes of failure tracebacks to hold in memory until the documents are written. "
+        "Beyond that, they are kept in files alongside the captured output logs",
+        type=float,
+        default=64,
+    )
+    addoption(
+        "--rst-failure-digest",
+        dest="rst_failure_digest",
+        help="Write a failures.rst that groups failed tests by the cause of the failure, with "
+        "links to each test",
+        action="store_true",
+        default=False,
+    )
+
+
+def pytest_addoption(parser):
+    """
+    Add in options for generating docs.
+
+    """
+    group = parser.getgroup("RST Writer", description="RST documentation generator options")
     group.addoption(
         "--rst-dir",
         help="Destination directory for generated RST documentation",
@@ -768,22 +3460,103 @@ def pytest_addoption(parser):
         action="store_true",
         default=True,
     )
+    add_render_options(group.addoption)
     group.addoption(
-        "--rst-cut-dir", dest="rst_cut_dir", help="Trim document node names", action="store"
+        "--rst-stream",
+        dest="rst_stream",
+        help="Write each module's RST document as soon as its last test finishes, rather than "
+        "holding every document in memory until the end of the session",
+        action="store_true",
+        default=False,
     )
     group.addoption(
-        "--rst-label-prefix",
-        dest="rst_label_prefix",
-        help="Text to prepend to generated test labels",
-        action="store",
-        default="",
+        "--rst-store",
+        dest="rst_store",
+        help="Also save every test's results to a result store in the RST directory, as "
+        "results.jsonl or results.sqlite. The RST documents can be rendered again from it "
+        "without running the tests, with python -m pytest_docgen render",
+        choices=sorted(RESULT_STORES),
+        default=None,
+    )
+    group.addoption(
+        "--rst-log-compress",
+        dest="rst_log_compress",
+        help="Write each module's captured output to a compressed log store, "
+        "logs/<module>.log.gz, rather than a plain text log. Each test's capture can be read on "
+        "its own, and the documents include it with the docgen-log-include directive of the "
+        "pytest_docgen.sphinxext.log_include extension",
+        action="store_true",
+        default=False,
+    )
+    group.addoption(
+        "--rst-log-test-bytes",
+        dest="rst_log_test_bytes",
+        help="KB of logs and captured output to keep for each test. Output beyond that is cut "
+        "down to its first and last lines (see --rst-log-keep-lines) (default: no limit)",
+        type=float,
+        default=0,
+    )
+    group.addoption(
+        "--rst-log-test-lines",
+        dest="rst_log_test_lines",
+        help="Lines of logs and captured output to keep for each test (default: no limit)",
+        type=int,
+        default=0,
+    )
+    group.addoption(
+        "--rst-log-session-bytes",
+        dest="rst_log_session_bytes",
+        help="Megabytes of logs and captured output to keep for the whole session. Once that is "
+        "used up, tests only keep the first and last lines of their output (default: no limit)",
+        type=float,
+        default=0,
+    )
+    group.addoption(
+        "--rst-log-session-lines",
+        dest="rst_log_session_lines",
+        help="Lines of logs and captured output to keep for the whole session (default: no limit)",
+        type=int,
+        default=0,
+    )
+    group.addoption(
+        "--rst-log-keep-lines",
+        dest="rst_log_keep_lines",
+        help="Lines kept from the start and from the end of output that is over the log budgets",
+        type=int,
+        default=50,
+    )
+    group.addoption(
+        "--rst-log-archive",
+        dest="rst_log_archive",
+        help="Write the whole of any output that is cut down to a compressed archive next to the "
+        "module's captured output log, logs/<module>.archive.gz, indexed by test id in "
+        "logs/<module>.archive.json",
+        action="store_true",
+        default=False,
+    )
+    group.addoption(
+        "--rst-profile",
+        dest="rst_profile",
+        help="Time docgen's hooks and document rendering. A summary is printed at the end of the "
+        "session, and saved to docgen-profile.json in the RST directory",
+        action="store_true",
+        default=False,
     )
 
 
 def pytest_configure(config):
-    if config.getoption("rst_dir"):
-        if os.path.exists(path.join(config.getoption("rst_dir"), "logs")):
-            shutil.rmtree(path.join(config.getoption("rst_dir"), "logs"))
+    if not config.getoption("rst_dir"):
+        return
+    try:
+        settings = DocgenSettings(config.getoption, xdist_worker=_is_xdist_worker(config))
+    except ValueError as exc:
+        raise pytest.UsageError(str(exc))
+    config.pluginmanager.register(DocgenPlugin(settings), "docgen")
+    # In incremental mode, logs are only replaced when they change (and removed when no longer
+    # written to) at the end of the session.
+    if not settings.incremental and not settings.xdist_worker:
+        if os.path.exists(path.join(settings.rst_dir, "logs")):
+            shutil.rmtree(path.join(settings.rst_dir, "logs"))
 
 
 def doc_result(fixture):
@@ -1,7 +1,16 @@
 $(document).ready(function(){
 
-  // Expander (used for collapsible code blocks)
-  $('.expander-trigger').click(function(){
+  // Expander (used for collapsible code blocks). Delegated, so that it also works for blocks
+  // within lazily loaded ones.
+  $(document).on('click', '.expander-trigger', function(){
     $(this).toggleClass("expander-hidden");
+
+    // With collapsible_block_lazy, the body is fetched the first time the block is expanded.
+    var content = $(this).next('.expander-content');
+    var src = content.attr('data-src');
+    if (src && !$(this).hasClass('expander-hidden')) {
+      content.removeAttr('data-src');
+      content.load(src);
+    }
   });
 });
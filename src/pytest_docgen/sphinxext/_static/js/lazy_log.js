@@ -0,0 +1,41 @@
+document.addEventListener('click', function(event){
+
+  // A test's log is fetched from its log store the first time it's expanded. Only the log's own
+  // bytes are requested; a server that ignores the Range header sends the whole store, and the
+  // log is sliced out of that.
+  var trigger = event.target.closest('.expander-trigger');
+  if (!trigger) {
+    return;
+  }
+  var content = trigger.nextElementSibling;
+  if (!content || !content.classList.contains('docgen-log') || content.dataset.loaded) {
+    return;
+  }
+  content.dataset.loaded = 'true';
+
+  var pre = content.querySelector('pre');
+  var offset = parseInt(content.dataset.offset, 10);
+  var length = parseInt(content.dataset.length, 10);
+  var range = 'bytes=' + offset + '-' + (offset + length - 1);
+
+  fetch(content.dataset.logSrc, {headers: {Range: range}})
+    .then(function(response){
+      if (!response.ok) {
+        throw new Error(response.status + ' ' + response.statusText);
+      }
+      return response.arrayBuffer().then(function(data){
+        return response.status === 206 ? data : data.slice(offset, offset + length);
+      });
+    })
+    .then(function(data){
+      var stream = new Blob([data]).stream().pipeThrough(new DecompressionStream('gzip'));
+      return new Response(stream).text();
+    })
+    .then(function(text){
+      pre.textContent = text;
+    })
+    .catch(function(error){
+      pre.textContent = 'Could not load the log: ' + error.message;
+      delete content.dataset.loaded;
+    });
+});
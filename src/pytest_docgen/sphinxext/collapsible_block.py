@@ -17,6 +17,12 @@ heading : string
     A heading to put for the collapsible block. Clicking the heading
     expands or collapses the block
 
+With ``collapsible_block_lazy = True`` in ``conf.py``, the body of each block
+is written to an HTML fragment of its own under ``_collapsible/``, and only
+fetched when the block is first expanded. Pages with many blocks are then
+smaller and faster to write and load. Fetching the fragments needs the pages
+to be served over HTTP, rather than opened as files.
+
 Examples
 --------
 
@@ -39,9 +45,11 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import logging
 
 import os
+import re
 from docutils.parsers.rst import Directive
 from docutils.parsers.rst.directives import unchanged
 from sphinx.util.fileutil import copy_asset
+from sphinx.util.osutil import relative_uri
 
 
 log = logging.getLogger(__name__)
@@ -50,9 +58,6 @@ log = logging.getLogger(__name__)
 # Imports
 # -----------------------------------------------------------------------------
 
-# Standard library imports
-from os.path import basename
-
 # External imports
 from docutils import nodes
 from jinja2 import Environment, PackageLoader
@@ -62,6 +67,36 @@ _env = Environment(loader=PackageLoader("pytest_docgen.sphinxext", "_templates")
 CCB_PROLOGUE = _env.get_template("collapsible_block_prologue.html")
 CCB_EPILOGUE = _env.get_template("collapsible_block_epilogue.html")
 
+
+def _fragments(template, *fields):
+    """
+    Render a template once, with a sentinel for each of ``fields``, and split the output around
+    them. A block's HTML is then the static parts joined with its own values, rather than the
+    template rendered for every block.
+
+    :return: The static parts, and the field that goes between each pair of them.
+    """
+    html = template.render(**{name: "\0{}\0".format(name) for name in fields})
+    parts = re.split("\0(\\w+)\0", html)
+    return parts[0::2], parts[1::2]
+
+
+def _fill(fragments, **values):
+    parts, fields = fragments
+    html = [parts[0]]
+    for name, part in zip(fields, parts[1:]):
+        html.append(values[name])
+        html.append(part)
+    return "".join(html)
+
+
+_PROLOGUE = _fragments(CCB_PROLOGUE, "id", "heading")
+_LAZY_PROLOGUE = _fragments(CCB_PROLOGUE, "id", "heading", "src")
+_EPILOGUE = CCB_EPILOGUE.render()
+
+# Directory of the lazily loaded block bodies, in the HTML output.
+LAZY_DIR = "_collapsible"
+
 # -----------------------------------------------------------------------------
 # Globals and constants
 # -----------------------------------------------------------------------------
@@ -100,11 +135,11 @@ class CollapsibleBlock(Directive):
         self.assert_has_content()
         env = self.state.document.settings.env
 
-        rst_source = self.state_machine.node.document["source"]
-        rst_filename = basename(rst_source)
-
-        target_id = "%s.ccb-%d" % (rst_filename, env.new_serialno())
-        target_id = target_id.replace(".", "-")
+        # Serial numbers count up from 0 in each document, and a document is read by one
+        # process with -j, so the IDs don't depend on what else is read, or where.
+        serialno = env.new_serialno("collapsible-block")
+        target_id = "%s.ccb-%d" % (env.docname, serialno)
+        target_id = target_id.replace(".", "-").replace("/", "-")
         target_node = nodes.target("", "", ids=[target_id])
 
         node = collapsible_block("\n".join(self.content))
@@ -113,16 +148,49 @@ class CollapsibleBlock(Directive):
 
         node["heading"] = self.options.pop("heading", "Collapse")
         node["target_id"] = target_id
+        node["serialno"] = serialno
 
         return [target_node, node]
 
 
+def _lazy(translator):
+    builder = translator.builder
+    return (
+        builder.config.collapsible_block_lazy
+        and builder.name in ("html", "dirhtml")
+        and getattr(builder, "current_docname", None) is not None
+    )
+
+
 def html_visit_collapsible_block(self, node):
-    self.body.append(CCB_PROLOGUE.render(id=node["target_id"], heading=node["heading"]))
+    if not _lazy(self):
+        self.body.append(_fill(_PROLOGUE, id=node["target_id"], heading=node["heading"]))
+        return
+
+    # Write the body to a fragment of its own, named after the document and the block, so
+    # that parallel writers never write the same file.
+    start = len(self.body)
+    for child in node.children:
+        child.walkabout(self)
+    fragment = "".join(self.body[start:])
+    del self.body[start:]
+
+    docname = self.builder.current_docname
+    name = "{}/ccb-{}.html".format(docname, node["serialno"])
+    filename = os.path.join(self.builder.outdir, LAZY_DIR, *name.split("/"))
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(fragment)
+
+    # Relative to the page, the same way the builder gets its path to _images/.
+    src = relative_uri(self.builder.get_target_uri(docname), LAZY_DIR) + "/" + name
+    self.body.append(_fill(_LAZY_PROLOGUE, id=node["target_id"], heading=node["heading"], src=src))
+    self.body.append(_EPILOGUE)
+    raise nodes.SkipNode
 
 
 def html_depart_collapsible_block(self, node):
-    self.body.append(CCB_EPILOGUE.render())
+    self.body.append(_EPILOGUE)
 
 
 def copy_asset_files(app, exc):
@@ -137,10 +205,11 @@ def setup(app):
         collapsible_block, html=(html_visit_collapsible_block, html_depart_collapsible_block)
     )
     app.add_directive("collapsible-block", CollapsibleBlock)
+    app.add_config_value("collapsible_block_lazy", False, "html")
     app.connect("build-finished", copy_asset_files)
 
-    app.add_javascript("collapsible_block.js")
-    app.add_stylesheet("collapsible_block.css")
+    app.add_js_file("collapsible_block.js")
+    app.add_css_file("collapsible_block.css")
 
     return {
         "parallel_read_safe": True,
@@ -0,0 +1,158 @@
+"""Display a test's logs from a pytest-docgen log store, only loading
+them when they're expanded.
+
+With ``--rst-log-mode=lazy``, pytest-docgen writes each test file's logs
+to a compressed log store (``logs/<module>.logs.gz``), and refers to each
+log by its offset and length in the store::
+
+    .. docgen-log:: logs/test_module.logs.gz
+        :heading: call
+        :offset: 1024
+        :length: 187
+
+heading : string
+    A heading to put for the log. Clicking the heading expands or
+    collapses the log.
+
+offset, length : int
+    Where the compressed log is in the store.
+
+In HTML, the log stores are copied to ``_docgen_logs/``, and a collapsed
+placeholder is written for each log. Its log is fetched (with a Range
+request for just its bytes) and decompressed in the browser the first time
+it's expanded, so the pages stay small however much the tests logged.
+Fetching the logs needs the pages to be served over HTTP, rather than
+opened as files. Other builders get the log as a literal block.
+
+This extension sets up ``pytest_docgen.sphinxext.collapsible_block`` too,
+for the expander's styling.
+"""
+import os
+import shutil
+from html import escape
+
+from docutils import nodes
+from docutils.parsers.rst import Directive, directives
+from sphinx.util.fileutil import copy_asset
+from sphinx.util.osutil import relative_uri
+
+from pytest_docgen.logstore import index_filename, read_log
+from pytest_docgen.sphinxext.collapsible_block import _env, _fill, _fragments
+
+__all__ = ("docgen_log", "DocgenLog", "html_visit_docgen_log", "setup")
+
+LAZY_LOG = _env.get_template("lazy_log.html")
+_PLACEHOLDER = _fragments(LAZY_LOG, "heading", "src", "offset", "length")
+
+# Directory of the log stores, in the HTML output.
+LOG_DIR = "_docgen_logs"
+
+_JS_ASSETS = [os.path.join(os.path.dirname(__file__), "_static", "js", "lazy_log.js")]
+
+
+class docgen_log(nodes.General, nodes.Element):
+    pass
+
+
+class DocgenLog(Directive):
+    required_arguments = 1
+    option_spec = {
+        "heading": directives.unchanged,
+        "offset": directives.nonnegative_int,
+        "length": directives.nonnegative_int,
+    }
+
+    def run(self):
+        env = self.state.document.settings.env
+        rel_filename, _ = env.relfn2path(self.arguments[0])
+        env.note_dependency(rel_filename)
+        if not hasattr(env, "docgen_log_files"):
+            env.docgen_log_files = {}
+        env.docgen_log_files.setdefault(env.docname, set()).add(rel_filename)
+
+        node = docgen_log()
+        node["store"] = rel_filename.replace(os.path.sep, "/")
+        node["heading"] = self.options.get("heading", "Log")
+        node["offset"] = self.options.get("offset", 0)
+        node["length"] = self.options.get("length", 0)
+        return [node]
+
+
+def html_visit_docgen_log(self, node):
+    base = self.builder.get_target_uri(self.builder.current_docname)
+    src = relative_uri(base, LOG_DIR) + "/" + node["store"]
+    self.body.append(
+        _fill(
+            _PLACEHOLDER,
+            heading=escape(node["heading"]),
+            src=escape(src),
+            offset=str(node["offset"]),
+            length=str(node["length"]),
+        )
+    )
+    raise nodes.SkipNode
+
+
+def inline_logs(app, doctree, docname):
+    """
+    For builders other than HTML, read each log out of its store into the document.
+    """
+    if app.builder.format == "html":
+        return
+    for node in list(doctree.traverse(docgen_log)):
+        filename = os.path.join(app.srcdir, *node["store"].split("/"))
+        text = read_log(filename, node["offset"], node["length"])
+        node.replace_self(
+            [
+                nodes.rubric(text=node["heading"]),
+                nodes.literal_block(text, text, language="none"),
+            ]
+        )
+
+
+def purge_logs(app, env, docname):
+    if hasattr(env, "docgen_log_files"):
+        env.docgen_log_files.pop(docname, None)
+
+
+def merge_logs(app, env, docnames, other):
+    if not hasattr(env, "docgen_log_files"):
+        env.docgen_log_files = {}
+    for docname in docnames:
+        if docname in getattr(other, "docgen_log_files", {}):
+            env.docgen_log_files[docname] = other.docgen_log_files[docname]
+
+
+def copy_log_files(app, exc):
+    if exc is not None or app.builder.format != "html":
+        return
+    for path in _JS_ASSETS:
+        copy_asset(path, os.path.join(app.outdir, "_static"))
+    stores = set()
+    for rel_filenames in getattr(app.env, "docgen_log_files", {}).values():
+        stores.update(rel_filenames)
+    for rel_filename in sorted(stores):
+        for rel in (rel_filename, index_filename(rel_filename)):
+            src = os.path.join(app.srcdir, rel)
+            if os.path.exists(src):
+                dst = os.path.join(app.outdir, LOG_DIR, rel)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.copyfile(src, dst)
+
+
+def setup(app):
+    app.setup_extension("pytest_docgen.sphinxext.collapsible_block")
+    app.add_node(docgen_log, html=(html_visit_docgen_log, None))
+    app.add_directive("docgen-log", DocgenLog)
+    app.connect("doctree-resolved", inline_logs)
+    app.connect("env-purge-doc", purge_logs)
+    app.connect("env-merge-info", merge_logs)
+    app.connect("build-finished", copy_log_files)
+
+    app.add_js_file("lazy_log.js")
+
+    return {
+        "parallel_read_safe": True,
+        "parallel_write_safe": True,
+        "version": "1.0.0",
+    }
@@ -0,0 +1,93 @@
+"""Include a test's captured output from a pytest-docgen log store, as
+``literalinclude`` would from a plain text log.
+
+With ``--rst-log-compress``, pytest-docgen writes each module's captured
+output to a compressed log store (``logs/<module>.log.gz``), and includes
+each test's capture by its offset and length in the store::
+
+    .. docgen-log-include:: logs/test_module.log.gz
+        :offset: 1024
+        :length: 187
+
+Only that test's capture is read and decompressed, however big the store
+is. A capture can also be looked up by test id, in the store's index::
+
+    .. docgen-log-include:: logs/test_module.log.gz
+        :test: test_module.py__TestClass__test_one
+
+offset, length : int
+    Where the compressed capture is in the store.
+
+test : string
+    ID of the test, as in the index (``logs/<module>.log.json``).
+
+log : string
+    Name of the log within the test, in the index. ``Captured Output`` by
+    default.
+"""
+import os
+import zlib
+from functools import lru_cache
+
+from docutils import nodes
+from docutils.parsers.rst import Directive, directives
+
+from pytest_docgen.logstore import read_index, read_log
+
+__all__ = ("DocgenLogInclude", "setup")
+
+
+@lru_cache(maxsize=64)
+def _read_index(filename, mtime):
+    """
+    Read a log store's index, once for each time the store is written.
+    """
+    return read_index(filename)
+
+
+class DocgenLogInclude(Directive):
+    required_arguments = 1
+    option_spec = {
+        "offset": directives.nonnegative_int,
+        "length": directives.nonnegative_int,
+        "test": directives.unchanged_required,
+        "log": directives.unchanged_required,
+    }
+
+    def run(self):
+        env = self.state.document.settings.env
+        rel_filename, filename = env.relfn2path(self.arguments[0])
+        env.note_dependency(rel_filename)
+        reporter = self.state.document.reporter
+        try:
+            if "test" in self.options:
+                index = _read_index(filename, os.path.getmtime(filename))
+                log = self.options.get("log", "Captured Output")
+                try:
+                    offset, length = index[self.options["test"]][log]
+                except KeyError:
+                    msg = "No {!r} log of test {!r} in {}".format(
+                        log, self.options["test"], rel_filename
+                    )
+                    return [reporter.warning(msg, line=self.lineno)]
+            else:
+                offset = self.options.get("offset", 0)
+                length = self.options.get("length", 0)
+            text = read_log(filename, offset, length)
+        except (OSError, EOFError, ValueError, zlib.error) as exc:
+            msg = "Could not read the log from {}: {}".format(rel_filename, exc)
+            return [reporter.warning(msg, line=self.lineno)]
+
+        literal = nodes.literal_block(text, text, language="none")
+        literal.source, literal.line = self.state_machine.get_source_and_line(self.lineno)
+        return [literal]
+
+
+def setup(app):
+    app.add_directive("docgen-log-include", DocgenLogInclude)
+
+    return {
+        "parallel_read_safe": True,
+        "parallel_write_safe": True,
+        "version": "1.0.0",
+    }
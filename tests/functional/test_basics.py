@@ -1,4 +1,6 @@
+import json
 import os
+import re
 
 from pathlib import Path
 import pytest
@@ -28,6 +30,16 @@ def logging_file():
     yield (FUNC_TESTDATA / "tests_with_logging.py").read_text()
 
 
+@pytest.fixture(scope="module")
+def output_file():
+    yield (FUNC_TESTDATA / "tests_with_output.py").read_text()
+
+
+@pytest.fixture(scope="module")
+def params_file():
+    yield (FUNC_TESTDATA / "tests_with_params.py").read_text()
+
+
 class TestDocgenOptions:
     def test_no_rst_dir(self, basic_file, testdir):
         testdir.makepyfile(basic_file)
@@ -47,6 +59,38 @@ class TestDocgenOptions:
         loc = testdir.tmpdir
         assert "_docs" in os.listdir(loc)
 
+    def test_hooks_registered(self, testdir):
+        # Without --rst-dir, none of the docgen hooks should run at all.
+        config = testdir.parseconfigure()
+        assert config.pluginmanager.get_plugin("docgen") is None
+
+        config = testdir.parseconfigure("--rst-dir=_docs")
+        assert config.pluginmanager.get_plugin("docgen") is not None
+
+    def test_collector_from_config(self, testdir):
+        from pytest_docgen.pytest_docgen import NodeDocCollector
+
+        # Collectors can still be built from a pytest config, e.g. by conftests and plugins.
+        for args in ([], ["--rst-dir=_docs"]):
+            config = testdir.parseconfigure(*(args + ["--rst-cut-dir=suite"]))
+            node = ("suite/test_one", None, "suite/test_one.py", "function")
+            assert NodeDocCollector(*node, config=config).node_name == "test_one"
+            # Passed where the config used to be, in place of the settings.
+            doccol = NodeDocCollector(*(node + (False, None, None, None, config)))
+            assert doccol.node_name == "test_one"
+
+    def test_rst_cut_dir(self, basic_file, testdir):
+        testdir.mkpydir("suite")
+        testdir.tmpdir.join("suite", "test_basic.py").write(basic_file)
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-cut-dir=suite")
+        result.assert_outcomes(2, 0, 2)
+
+        docs = os.listdir(os.path.join(testdir.tmpdir, "_docs"))
+        assert "test_basic.rst" in docs
+        with open(os.path.join(testdir.tmpdir, "_docs", "test_basic.rst")) as f:
+            data = f.read()
+        assert "suite" not in data.split("literalinclude")[0]
+
     def test_rst_index(self, basic_file, testdir):
         testdir.makepyfile(basic_file)
         result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-write-index")
@@ -116,7 +160,6 @@ class TestDocgenOptions:
             data = f.read()
         assert ":module_fixture: Module" in data
 
-    @pytest.mark.xfail(reason="Need to sort out why logging not showing up in output")
     def test_logging(self, testdir, logging_file):
         testdir.makepyfile(logging_file)
         result = testdir.runpytest_inprocess("--rst-dir=_docs", "-o log_level=INFO")
@@ -130,4 +173,615 @@ class TestDocgenOptions:
 
         with open(os.path.join(loc, "_docs", test_rst_file)) as f:
             data = f.read()
-        assert "INFO     test_logging:test_logging.py:8 In module test" in data
+        assert "INFO     test_logging:test_logging.py:11 In module test" in data
+
+    def test_captured_output(self, testdir, output_file):
+        testdir.makepyfile(output_file)
+        result = testdir.runpytest_inprocess("--rst-dir=_docs")
+        result.assert_outcomes(3, 0, 0)
+
+        loc = testdir.tmpdir
+        with open(os.path.join(loc, "_docs", "test_captured_output.rst")) as f:
+            data = f.read()
+        with open(os.path.join(loc, "_docs", "logs", "test_captured_output.log")) as f:
+            log_lines = f.read().splitlines()
+
+        # Each literalinclude range should cover exactly that test's captured output.
+        ranges = re.findall(r":lines: (\d+)-(\d+)", data)
+        assert ranges == [("1", "3"), ("4", "9")]
+        start, end = (int(x) for x in ranges[0])
+        assert log_lines[start - 1 : end] == [
+            "{0} Captured stdout {0}".format("=" * 20),
+            "stdout from module test",
+            "{0} End stdout {0}".format("=" * 20),
+        ]
+        start, end = (int(x) for x in ranges[1])
+        assert "more stdout from class test" in log_lines[start - 1 : end]
+
+    def test_rst_stream(self, testdir, basic_file):
+        testdir.makepyfile(
+            test_first=basic_file,
+            test_second="""
+                import os
+
+                def test_first_module_written():
+                    assert os.path.exists(os.path.join("_docs", "test_first.rst"))
+                """,
+        )
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-stream")
+        result.assert_outcomes(3, 0, 2)
+
+        loc = testdir.tmpdir
+        assert "test_second.rst" in os.listdir(os.path.join(loc, "_docs"))
+        with open(os.path.join(loc, "_docs", "overview.rst")) as f:
+            data = f.read()
+        assert "test_passing_class_level" in data
+        assert "test_first_module_written" in data
+
+    def test_xdist(self, testdir, basic_file, fixture_file):
+        pytest.importorskip("xdist")
+        testdir.makepyfile(test_basic=basic_file, test_fixtures=fixture_file)
+        args = ["--rst-fixture-results", "--rst-run-id=run"]
+        result = testdir.runpytest_inprocess("--rst-dir=_serial", *args)
+        result.assert_outcomes(5, 0, 4, 1)
+        result = testdir.runpytest_inprocess("--rst-dir=_xdist", "-n", "2", *args)
+        result.assert_outcomes(5, 0, 4, 1)
+
+        # Workers don't write anything themselves, the controller writes each document once,
+        # in collection order.
+        loc = testdir.tmpdir
+        for doc in ("test_basic.rst", "test_fixtures.rst", "overview.rst"):
+            with open(os.path.join(loc, "_serial", doc)) as f:
+                serial = re.sub(r"0x[0-9a-f]+", "0x0", f.read())
+            with open(os.path.join(loc, "_xdist", doc)) as f:
+                xdist = re.sub(r"0x[0-9a-f]+", "0x0", f.read())
+            assert serial == xdist
+
+    def test_rst_workers(self, testdir, basic_file, fixture_file, generic_file):
+        testdir.makepyfile(
+            test_basic=basic_file, test_fixtures=fixture_file, test_generic=generic_file
+        )
+        args = ["--rst-fixture-results", "--rst-run-id=run"]
+        result = testdir.runpytest_inprocess("--rst-dir=_serial", *args)
+        result.assert_outcomes(8, 0, 6, 2)
+        result = testdir.runpytest_inprocess("--rst-dir=_pool", "--rst-workers=2", *args)
+        result.assert_outcomes(8, 0, 6, 2)
+
+        loc = testdir.tmpdir
+        for doc in ("test_basic.rst", "test_fixtures.rst", "test_generic.rst", "overview.rst"):
+            with open(os.path.join(loc, "_serial", doc)) as f:
+                serial = re.sub(r"0x[0-9a-f]+", "0x0", f.read())
+            with open(os.path.join(loc, "_pool", doc)) as f:
+                pool = re.sub(r"0x[0-9a-f]+", "0x0", f.read())
+            assert serial == pool
+
+    def test_rst_incremental(self, testdir, output_file):
+        testdir.makepyfile(output_file)
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-incremental")
+        result.assert_outcomes(3, 0, 0)
+
+        docs = os.path.join(testdir.tmpdir, "_docs")
+        module_doc = os.path.join(docs, "test_rst_incremental.rst")
+        log = os.path.join(docs, "logs", "test_rst_incremental.log")
+        with open(module_doc) as f:
+            first = f.read()
+        for written in (module_doc, log):
+            os.utime(written, (0, 0))
+
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-incremental")
+        result.assert_outcomes(3, 0, 0)
+
+        # Nothing about the module changed, so neither it nor its log were rewritten.
+        assert os.path.getmtime(module_doc) == 0
+        assert os.path.getmtime(log) == 0
+        # ...but the overview gets another table.
+        assert os.path.getmtime(os.path.join(docs, "overview.rst")) != 0
+        with open(module_doc) as f:
+            assert f.read() == first
+        assert not os.path.exists(log + ".tmp")
+
+    def test_rst_incremental_lazy_logs(self, testdir):
+        testdir.makepyfile(
+            """
+            import logging
+
+            def test_logs():
+                logging.getLogger(__name__).warning("a warning")
+                print("some output")
+            """
+        )
+        args = ["--rst-dir=_docs", "--rst-incremental", "--rst-log-mode=lazy", "-o log_level=INFO"]
+        result = testdir.runpytest_inprocess(*args)
+        result.assert_outcomes(1, 0, 0)
+
+        logs = os.path.join(testdir.tmpdir, "_docs", "logs")
+        stores = [
+            os.path.join(logs, "test_rst_incremental_lazy_logs" + ext)
+            for ext in (".logs.gz", ".logs.json", ".log.gz", ".log.json")
+        ]
+        for store in stores:
+            os.utime(store, (0, 0))
+
+        result = testdir.runpytest_inprocess(*args)
+        result.assert_outcomes(1, 0, 0)
+
+        # The logs are the same, so their stores weren't rewritten, and Sphinx won't re-read
+        # the documents that depend on them.
+        for store in stores:
+            assert os.path.getmtime(store) == 0
+            assert not os.path.exists(store + ".tmp")
+
+    def test_rst_failure_budget(self, testdir, basic_file):
+        testdir.makepyfile(basic_file)
+        docs = os.path.join(testdir.tmpdir, "_docs")
+        module_doc = os.path.join(docs, "test_rst_failure_budget.rst")
+        result = testdir.runpytest_inprocess("--rst-dir=_docs")
+        result.assert_outcomes(2, 0, 2)
+        with open(module_doc) as f:
+            in_memory = re.sub("0x[0-9a-f]+", "0x", f.read())
+        assert "Failure Details" in in_memory
+
+        # With no budget, every traceback is read back from the sidecar file, which is removed
+        # once the document is written.
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-failure-budget=0")
+        result.assert_outcomes(2, 0, 2)
+        with open(module_doc) as f:
+            assert re.sub("0x[0-9a-f]+", "0x", f.read()) == in_memory
+        assert not os.path.exists(os.path.join(docs, "logs", "test_rst_failure_budget.failures"))
+
+    def test_rst_failure_digest(self, testdir):
+        testdir.makepyfile(
+            """
+            import pytest
+
+            @pytest.fixture
+            def broken():
+                raise RuntimeError("backend at %s is down" % hex(id(object())))
+
+            @pytest.mark.parametrize("index", range(3))
+            def test_uses_broken(broken, index):
+                pass
+
+            def test_fails():
+                assert 1 == 2
+
+            @pytest.mark.skip(reason="not today")
+            def test_skipped():
+                pass
+            """
+        )
+        result = testdir.runpytest_inprocess(
+            "--rst-dir=_docs", "--rst-failure-digest", "--rst-store=jsonl"
+        )
+        result.assert_outcomes(0, 1, 1, 3)
+
+        docs = os.path.join(testdir.tmpdir, "_docs")
+        with open(os.path.join(docs, "failures.rst")) as f:
+            data = f.read()
+        # Skipped phases aren't failures.
+        assert "4 failed test phases, from 2 distinct causes." in data
+        assert "not today" not in data
+        # The most common cause comes first, linking to every test that failed from it.
+        assert data.index("backend at 0x is down") < data.index("assert 1 == 2")
+        assert "Failed test phases: **3**" in data
+        for index in range(3):
+            assert (
+                ":ref:`test_uses_broken[{0}] <test_rst_failure_digest.py__test_uses_broken[{0}]>`"
+                " (setup)".format(index) in data
+            )
+
+        # Nor once rendered again from the result store.
+        from pytest_docgen.__main__ import main
+
+        os.remove(os.path.join(docs, "failures.rst"))
+        main(["render", docs, "--rst-failure-digest"])
+        with open(os.path.join(docs, "failures.rst")) as f:
+            assert f.read() == data
+
+    def test_rst_failure_digest_markup(self, testdir):
+        nodes = pytest.importorskip("docutils.nodes")
+        from docutils.core import publish_doctree
+
+        testdir.makepyfile(
+            """
+            def test_fails():
+                raise ValueError("*bad* `name` for |sub| my_var_ [ref]_ <url>::")
+            """
+        )
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-failure-digest")
+        result.assert_outcomes(0, 0, 1)
+
+        # The error line is a section title as it is, not markup to be read.
+        with open(os.path.join(testdir.tmpdir, "_docs", "failures.rst")) as f:
+            doctree = publish_doctree(f.read(), settings_overrides={"report_level": 5})
+        titles = [section[0].astext() for section in doctree.traverse(nodes.section)]
+        assert titles == ["1. ValueError: *bad* `name` for |sub| my_var_ [ref]_ <url>::"]
+
+    @pytest.mark.parametrize("store", ["jsonl", "sqlite"])
+    def test_rst_store(self, testdir, output_file, store):
+        from pytest_docgen.pytest_docgen import RESULT_STORE_FILENAMES, read_result_store
+
+        testdir.makepyfile(output_file)
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-store={}".format(store))
+        result.assert_outcomes(3, 0, 0)
+
+        docs = os.path.join(testdir.tmpdir, "_docs")
+        records = list(read_result_store(os.path.join(docs, RESULT_STORE_FILENAMES[store])))
+        assert [record["test"]["name"] for record in records] == [
+            "test_stdout_module_level",
+            "test_no_output",
+            "test_stdout_and_stderr",
+        ]
+        # The module is only stored in full with the first test, after that just its node ID.
+        assert records[1]["parents"] == [{"nodeid": "test_rst_store.py"}]
+        stages = records[0]["test"]["stages"]
+        assert [(when, outcome) for when, outcome, _ in stages] == [
+            ("setup", "passed"),
+            ("call", "passed"),
+            ("teardown", "passed"),
+        ]
+        with open(os.path.join(docs, "test_rst_store.rst")) as f:
+            ranges = re.findall(r":lines: (\d+)-(\d+)", f.read())
+        assert ranges == [
+            tuple(str(line) for line in record["test"]["capture"])
+            for record in records
+            if record["test"]["capture"][0] != record["test"]["capture"][1]
+        ]
+
+    def test_rst_build_order(self, testdir, basic_file):
+        testdir.makepyfile(basic_file)
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-build-order=source,results")
+        result.assert_outcomes(2, 0, 2)
+
+        with open(os.path.join(testdir.tmpdir, "_docs", "test_rst_build_order.rst")) as f:
+            data = f.read()
+        assert data.index("Source Code") < data.index("Results")
+        assert "Test Output" not in data
+
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-build-order=results,bogus")
+        result.stderr.fnmatch_lines(["*Unknown section(s) in build order: bogus*"])
+
+    def test_rst_aggregate_params(self, testdir, params_file):
+        testdir.makepyfile(params_file)
+        result = testdir.runpytest_inprocess(
+            "--rst-dir=_docs", "--rst-aggregate-params", "--rst-fixture-results"
+        )
+        result.assert_outcomes(6, 0, 1)
+
+        with open(os.path.join(testdir.tmpdir, "_docs", "test_rst_aggregate_params.rst")) as f:
+            data = f.read()
+        assert data.count("\nThis is a parametrized test.\n") == 1
+        assert data.count("\nThis is a parametrized class-level test.\n") == 1
+        assert data.count("literalinclude") == 4
+        # The fixture that's the same for every case is written once, with the group.
+        assert data.count("This is the shared fixture's doc.") == 2
+        # Every case can still be linked to.
+        for case in ("test_values[1]", "test_values[3]", "TestClass__test_words[two]"):
+            assert ".. _test_rst_aggregate_params.py__{}:".format(case) in data
+        # Only the failed case is written out in full.
+        assert "\ntest_values[3]\n" in data
+        assert "\ntest_values[1]\n" not in data
+        assert data.count("**Captured Output**") == 1
+        assert ":ref:`3 <test_rst_aggregate_params.py__test_values[3]>`" in data
+        assert "\ntest_single\n" in data
+
+    def test_rst_shard_tests(self, testdir, basic_file):
+        testdir.makepyfile(basic_file)
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-shard-tests=2")
+        result.assert_outcomes(2, 0, 2)
+
+        docs = os.path.join(testdir.tmpdir, "_docs")
+        with open(os.path.join(docs, "test_rst_shard_tests.rst")) as f:
+            data = f.read()
+        assert "test_rst_shard_tests/part-1\n   test_rst_shard_tests/part-2\n" in data
+        assert "Results" not in data
+        with open(os.path.join(docs, "test_rst_shard_tests", "part-1.rst")) as f:
+            data = f.read()
+        assert data.startswith("test_rst_shard_tests (1 of 2)\n")
+        assert data.count("Results") == 2
+        # The pages are a directory down, so included files are too.
+        assert ".. literalinclude:: ../../test_rst_shard_tests.py" in data
+        with open(os.path.join(docs, "test_rst_shard_tests", "part-2.rst")) as f:
+            assert "TestClass" in f.read()
+
+        # Pages the module no longer needs are removed.
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-shard-tests=10")
+        result.assert_outcomes(2, 0, 2)
+        assert not os.listdir(os.path.join(docs, "test_rst_shard_tests"))
+        with open(os.path.join(docs, "test_rst_shard_tests.rst")) as f:
+            assert f.read().count("Results") == 4
+
+    @pytest.mark.parametrize("mode", ["lines", "inline"])
+    def test_rst_source_mode(self, testdir, basic_file, mode):
+        testdir.makepyfile(basic_file)
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-source-mode=" + mode)
+        result.assert_outcomes(2, 0, 2)
+
+        with open(os.path.join(testdir.tmpdir, "_docs", "test_rst_source_mode.rst")) as f:
+            data = f.read()
+        assert ":pyobject:" not in data
+        if mode == "lines":
+            assert data.count(":lines: 1-5") == 1
+            assert data.count(":lines: 22-26") == 1
+        else:
+            assert "literalinclude:: ../" not in data
+            assert "      def test_passing_module_level():\n" in data
+            assert "          def test_failing_class_level(self):\n" in data
+
+    def test_rst_log_mode(self, testdir, output_file):
+        testdir.makepyfile(output_file)
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-log-mode=lazy")
+        result.assert_outcomes(3, 0, 0)
+
+        docs = os.path.join(testdir.tmpdir, "_docs")
+        with open(os.path.join(docs, "test_rst_log_mode.rst")) as f:
+            data = f.read()
+        assert "literalinclude:: logs/" not in data
+        # The captured output is only written to its log store, not to a plain text log too.
+        assert data.count(".. docgen-log:: logs/test_rst_log_mode.log.gz") == 2
+        assert not os.path.exists(os.path.join(docs, "logs", "test_rst_log_mode.log"))
+
+        from pytest_docgen.logstore import read_index, read_log
+
+        store = os.path.join(docs, "logs", "test_rst_log_mode.log.gz")
+        index = read_index(store)
+        offset, length = index["test_rst_log_mode.py__TestClass__test_stdout_and_stderr"][
+            "Captured Output"
+        ]
+        assert ":offset: {}\n".format(offset) in data
+        assert read_log(store, offset, length).splitlines() == [
+            "{0} Captured stdout {0}".format("=" * 20),
+            "stdout from class test",
+            "more stdout from class test",
+            "{0} End stdout {0}".format("=" * 20),
+            "{0} Captured stdout {0}".format("=" * 20),
+            "stderr from class test",
+            "{0} End stdout {0}".format("=" * 20),
+        ]
+
+        # Rendered lazily from the store of a run that wrote a plain text log, the captures are
+        # copied into the test file's log store.
+        from pytest_docgen.__main__ import main
+
+        result = testdir.runpytest_inprocess("--rst-dir=_plain", "--rst-store=jsonl")
+        result.assert_outcomes(3, 0, 0)
+        assert main(["render", "_plain", "--rst-log-mode=lazy"]) == 0
+        plain = os.path.join(testdir.tmpdir, "_plain")
+        with open(os.path.join(plain, "test_rst_log_mode.rst")) as f:
+            assert f.read().count(".. docgen-log:: logs/test_rst_log_mode.logs.gz") == 2
+        store = os.path.join(plain, "logs", "test_rst_log_mode.logs.gz")
+        offset, length = read_index(store)[
+            "test_rst_log_mode.py__TestClass__test_stdout_and_stderr"
+        ]["Captured Output"]
+        # The same lines the literalinclude would have included.
+        with open(os.path.join(plain, "logs", "test_rst_log_mode.log")) as f:
+            log_lines = f.read().splitlines(True)
+        assert read_log(store, offset, length) == "".join(log_lines[3:9])
+
+    def test_rst_log_compress(self, testdir, output_file):
+        testdir.makepyfile(output_file)
+        result = testdir.runpytest_inprocess(
+            "--rst-dir=_docs", "--rst-log-compress", "--rst-store=jsonl"
+        )
+        result.assert_outcomes(3, 0, 0)
+
+        docs = os.path.join(testdir.tmpdir, "_docs")
+        assert not os.path.exists(os.path.join(docs, "logs", "test_rst_log_compress.log"))
+        with open(os.path.join(docs, "test_rst_log_compress.rst")) as f:
+            data = f.read()
+        assert "literalinclude:: logs/" not in data
+        includes = re.findall(
+            r"docgen-log-include:: logs/test_rst_log_compress.log.gz\n"
+            r"      :offset: (\d+)\n      :length: (\d+)",
+            data,
+        )
+        assert len(includes) == 2
+
+        from pytest_docgen.logstore import read_index, read_log
+
+        store = os.path.join(docs, "logs", "test_rst_log_compress.log.gz")
+        offset, length = (int(x) for x in includes[1])
+        assert read_index(store)["test_rst_log_compress.py__TestClass__test_stdout_and_stderr"] == {
+            "Captured Output": [offset, length]
+        }
+        assert read_log(store, offset, length).splitlines() == [
+            "{0} Captured stdout {0}".format("=" * 20),
+            "stdout from class test",
+            "more stdout from class test",
+            "{0} End stdout {0}".format("=" * 20),
+            "{0} Captured stdout {0}".format("=" * 20),
+            "stderr from class test",
+            "{0} End stdout {0}".format("=" * 20),
+        ]
+
+        # Rendering from the result store includes the captures from the log store too.
+        from pytest_docgen.__main__ import main
+
+        os.remove(os.path.join(docs, "test_rst_log_compress.rst"))
+        assert main(["render", "_docs"]) == 0
+        with open(os.path.join(docs, "test_rst_log_compress.rst")) as f:
+            assert f.read() == data
+
+    def test_rst_log_budget(self, testdir):
+        testdir.makepyfile(
+            """
+            def test_runaway():
+                for i in range(100):
+                    print("line {}".format(i))
+
+            def test_quiet():
+                print("quiet")
+            """
+        )
+        result = testdir.runpytest_inprocess(
+            "--rst-dir=_docs",
+            "--rst-log-test-lines=10",
+            "--rst-log-keep-lines=2",
+            "--rst-log-archive",
+        )
+        result.assert_outcomes(2, 0, 0)
+
+        logs = os.path.join(testdir.tmpdir, "_docs", "logs")
+        with open(os.path.join(logs, "test_rst_log_budget.log")) as f:
+            log_lines = f.read().splitlines()
+        assert log_lines[1:6] == [
+            "line 0",
+            "line 1",
+            "[... 96 lines (760 bytes) of stdout elided; the whole of it is in "
+            "logs/test_rst_log_budget.archive.gz ...]",
+            "line 98",
+            "line 99",
+        ]
+        assert "quiet" in log_lines
+
+        from pytest_docgen.logstore import read_index, read_log
+
+        store = os.path.join(logs, "test_rst_log_budget.archive.gz")
+        offset, length = read_index(store)["test_rst_log_budget.py__test_runaway"]["stdout"]
+        assert read_log(store, offset, length).count("\n") == 100
+
+    def test_render(self, testdir, output_file, basic_file):
+        from pytest_docgen.__main__ import main
+
+        testdir.makepyfile(test_output=output_file, test_basic=basic_file)
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-store=jsonl")
+        result.assert_outcomes(5, 0, 2)
+
+        docs = os.path.join(testdir.tmpdir, "_docs")
+        written = {}
+        for name in ("test_output.rst", "test_basic.rst", "overview.rst"):
+            with open(os.path.join(docs, name)) as f:
+                written[name] = f.read()
+            os.remove(os.path.join(docs, name))
+
+        # Rendering from the store writes the same documents, without running any tests.
+        assert main(["render", "_docs"]) == 0
+        for name, data in written.items():
+            with open(os.path.join(docs, name)) as f:
+                assert f.read() == data
+
+        assert main(["render", "_docs/results.jsonl", "--rst-label-prefix=nightly-"]) == 0
+        with open(os.path.join(docs, "test_basic.rst")) as f:
+            assert ".. _nightly-test_basic.py__test_failing_module_level:" in f.read()
+
+        # Rendering into another directory brings the captured output logs along, again and again.
+        for _ in range(2):
+            assert main(["render", "_docs", "--rst-dir=_other"]) == 0
+        with open(os.path.join(docs, "logs", "test_output.log")) as f:
+            log = f.read()
+        with open(os.path.join(testdir.tmpdir, "_other", "logs", "test_output.log")) as f:
+            assert f.read() == log
+
+    def test_overview_runs(self, testdir, basic_file):
+        testdir.makepyfile(basic_file)
+        overview = os.path.join(testdir.tmpdir, "_docs", "overview.rst")
+        tables = []
+        for run_id in ("first", "second", "third"):
+            result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-run-id=" + run_id)
+            result.assert_outcomes(2, 0, 2)
+            with open(overview) as f:
+                data = f.read()
+            # Each run's table is appended to what was already there.
+            assert data.startswith(tables[-1] if tables else "")
+            tables.append(data)
+        assert data.count("Test Name") == 3
+        # Each under a heading naming its run.
+        headings = ["Run: {}\n{}\n".format(x, "=" * len("Run: " + x)) for x in ("first", "second")]
+        assert data.index(headings[0]) < data.index(headings[1]) < data.index("Run: third")
+
+        # The same run ID replaces its table, and only the newest runs are kept.
+        result = testdir.runpytest_inprocess(
+            "--rst-dir=_docs", "--rst-run-id=second", "--rst-keep-runs=2"
+        )
+        result.assert_outcomes(2, 0, 2)
+        with open(overview) as f:
+            assert f.read() == tables[1].replace("Run: first", "Run: third")
+        with open(os.path.join(testdir.tmpdir, "_docs", ".docgen-overview.json")) as f:
+            assert [run["run_id"] for run in json.load(f)["runs"]] == ["third", "second"]
+
+    def test_overview_pages(self, testdir, basic_file):
+        testdir.makepyfile(basic_file)
+        for run_id in ("first", "second"):
+            result = testdir.runpytest_inprocess(
+                "--rst-dir=_docs", "--rst-overview-pages", "--rst-run-id=" + run_id
+            )
+            result.assert_outcomes(2, 0, 2)
+
+        docs = os.path.join(testdir.tmpdir, "_docs")
+        assert sorted(os.listdir(os.path.join(docs, "overview"))) == ["first.rst", "second.rst"]
+        with open(os.path.join(docs, "overview.rst")) as f:
+            data = f.read()
+        assert "Test Name" not in data
+        assert data.index(":doc:`second <overview/second>`") < data.index(
+            ":doc:`first <overview/first>`"
+        )
+        with open(os.path.join(docs, "overview", "first.rst")) as f:
+            assert "Test Name" in f.read()
+
+    def test_overview_pages_toggled(self, testdir, basic_file):
+        testdir.makepyfile(basic_file)
+        overview = os.path.join(testdir.tmpdir, "_docs", "overview.rst")
+        written = []
+        for run_id, pages in (("first", False), ("second", True), ("third", False)):
+            args = ["--rst-dir=_docs", "--rst-run-id=" + run_id]
+            if pages:
+                args.append("--rst-overview-pages")
+            result = testdir.runpytest_inprocess(*args)
+            result.assert_outcomes(2, 0, 2)
+            with open(overview) as f:
+                data = f.read()
+            # What was written in the other mode is kept, ahead of the new runs.
+            assert data.startswith(written[-1] if written else "")
+            written.append(data)
+        assert data.count("Test Name") == 2
+        assert data.index("Test Name") < data.index(":doc:`second <overview/second>`")
+
+        result = testdir.runpytest_inprocess(
+            "--rst-dir=_docs", "--rst-run-id=fourth", "--rst-overview-pages"
+        )
+        result.assert_outcomes(2, 0, 2)
+        with open(overview) as f:
+            data = f.read()
+        assert data.startswith(written[-1])
+        assert data.count("Test Result Table(s)") == 1
+        assert ":doc:`fourth <overview/fourth>`" in data
+
+    def test_overview_page_size(self, testdir, basic_file):
+        testdir.makepyfile(basic_file)
+        result = testdir.runpytest_inprocess(
+            "--rst-dir=_docs",
+            "--rst-run-id=first",
+            "--rst-overview-page-size=3",
+            "--rst-overview-format=list-table",
+        )
+        result.assert_outcomes(2, 0, 2)
+
+        docs = os.path.join(testdir.tmpdir, "_docs")
+        with open(os.path.join(docs, "overview.rst")) as f:
+            data = f.read()
+        assert "Test Name" not in data
+        assert "/overview/first-1\n   /overview/first-2\n" in data
+        with open(os.path.join(docs, "overview", "first-1.rst")) as f:
+            page = f.read()
+        assert "Test Results: first (1-3)" in page
+        assert page.count("   * - ") == 4
+        with open(os.path.join(docs, "overview", "first-2.rst")) as f:
+            assert f.read().count("   * - ") == 2
+
+        # Replacing the run removes its pages.
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-run-id=first")
+        assert not os.listdir(os.path.join(docs, "overview"))
+
+    def test_rst_profile(self, testdir, output_file):
+        testdir.makepyfile(output_file)
+        result = testdir.runpytest_inprocess("--rst-dir=_docs", "--rst-profile")
+        result.assert_outcomes(3, 0, 0)
+        result.stdout.fnmatch_lines(["*docgen profile*", "pytest_runtest_makereport * 9 *"])
+
+        with open(os.path.join(testdir.tmpdir, "_docs", "docgen-profile.json")) as f:
+            profile = {row["name"]: row for row in json.load(f)}
+        assert profile["add_capture"]["calls"] == 3
+        # Every collector gets each section built: module, class and three tests.
+        assert profile["_build_results"]["calls"] == 5
+        assert profile["_write_document"]["calls"] == 1
+        assert profile["pytest_sessionfinish"]["p99"] <= profile["pytest_sessionfinish"]["max"]
@@ -0,0 +1,25 @@
+import sys
+
+
+def test_stdout_module_level():
+    """
+    This is a module-level test that prints.
+    """
+    print("stdout from module test")
+
+
+def test_no_output():
+    """
+    This is a module-level test that doesn't print.
+    """
+    pass
+
+
+class TestClass:
+    def test_stdout_and_stderr(self):
+        """
+        This is a class-level test that prints to stdout and stderr.
+        """
+        print("stdout from class test")
+        print("more stdout from class test")
+        sys.stderr.write("stderr from class test\n")
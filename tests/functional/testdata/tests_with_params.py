@@ -0,0 +1,33 @@
+import pytest
+
+
+@pytest.fixture
+def shared():
+    """
+    This is the shared fixture's doc.
+    """
+    return "shared"
+
+
+@pytest.mark.parametrize("value", [1, 2, 3, 4])
+def test_values(shared, value):
+    """
+    This is a parametrized test.
+    """
+    print("checking {}".format(value))
+    assert value != 3
+
+
+class TestClass:
+    @pytest.mark.parametrize("word", ["one", "two"])
+    def test_words(self, word):
+        """
+        This is a parametrized class-level test.
+        """
+        pass
+
+    def test_single(self):
+        """
+        This is a test that isn't parametrized.
+        """
+        pass
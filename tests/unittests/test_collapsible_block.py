@@ -0,0 +1,17 @@
+import pytest
+
+collapsible_block = pytest.importorskip("pytest_docgen.sphinxext.collapsible_block")
+
+
+@pytest.mark.parametrize("src", [None, "_collapsible/test_module/ccb-0.html"])
+def test_prologue_same_as_template(src):
+    values = {"id": "test_module-ccb-0", "heading": "call"}
+    if src is None:
+        html = collapsible_block._fill(collapsible_block._PROLOGUE, **values)
+    else:
+        html = collapsible_block._fill(collapsible_block._LAZY_PROLOGUE, src=src, **values)
+    assert html == collapsible_block.CCB_PROLOGUE.render(src=src, **values)
+
+
+def test_epilogue_same_as_template():
+    assert collapsible_block._EPILOGUE == collapsible_block.CCB_EPILOGUE.render()
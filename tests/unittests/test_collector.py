@@ -0,0 +1,61 @@
+import pickle
+
+from pytest_docgen.pytest_docgen import DEFAULT_BUILD_ORDER, NodeDocCollector, ParamGroup
+
+
+def make_collector(name):
+    return NodeDocCollector(name, None, "test_module.py::" + name, level="function")
+
+
+def test_build_order_of_its_own():
+    first = make_collector("test_one")
+    second = make_collector("test_two")
+
+    first.add_section("Notes", ["Some notes."])
+    # Changed in place too, as conftests may do.
+    first.build_order.remove("source")
+    assert first.build_order == ["fixtures", "results", "logs", "Notes"]
+    assert second.build_order == DEFAULT_BUILD_ORDER
+    assert DEFAULT_BUILD_ORDER == ["fixtures", "results", "source", "logs"]
+
+
+def test_pickle():
+    collector = make_collector("test_one")
+    collector.add_section("Notes", ["Some notes."])
+    collector.add_logdata("some log", "call")
+
+    copy = pickle.loads(pickle.dumps(collector))
+    assert copy.node_id == collector.node_id
+    assert copy.build_order == collector.build_order
+    assert copy.log_data == {"call": "some log"}
+    assert not hasattr(copy, "__dict__")
+
+
+def test_param_groups_only_consecutive_cases():
+    parent = NodeDocCollector("test_module.py", None, "test_module.py", level="module")
+    parent.aggregate_params = True
+    names = ["test_values[1]", "test_values[2]", "test_other", "test_values[3]", "test_values[4]"]
+    parent.children = [make_collector(name) for name in names]
+
+    docs = parent._child_docs()
+    # Cases stay where they ran; only the first group gets the function's label.
+    assert [doc.name if isinstance(doc, ParamGroup) else doc.node_name for doc in docs] == [
+        "test_values",
+        "test_other",
+        "test_values",
+    ]
+    assert [case.node_name for case in docs[2].cases] == ["test_values[3]", "test_values[4]"]
+    assert docs[0].label and not docs[2].label
+
+
+def test_fixtures_deduplicated_by_result():
+    collector = make_collector("test_one")
+    collector._add_fixture_info("config", "The config.", {"debug": True})
+    collector._add_fixture_info("config", "The config.", {"debug": True})
+    collector._add_fixture_info("config", "The config.", ["debug"])
+    collector._add_fixture_info("config", "The config.", {"debug": False})
+    assert [result for _, _, result in collector._fixtures] == [
+        {"debug": True},
+        ["debug"],
+        {"debug": False},
+    ]
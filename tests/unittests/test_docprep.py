@@ -1,5 +1,5 @@
 import pytest
-from pytest_docgen.pytest_docgen import doc_prep
+from pytest_docgen.pytest_docgen import doc_prep, fixture_doc
 
 
 DOCPREP_TESTDATA = [
@@ -23,3 +23,17 @@ DOCPREP_TESTDATA = [
 )
 def test_docprep(inval, outval):
     assert outval == doc_prep(inval)
+
+
+def test_fixture_doc_cached():
+    def my_fixture():
+        """
+        Set up a thing.
+            Indented.
+        """
+
+    assert fixture_doc(my_fixture) == "Set up a thing.\n    Indented."
+    my_fixture.__doc__ = "changed"
+    # Prepared once per fixture function.
+    assert fixture_doc(my_fixture) == "Set up a thing.\n    Indented."
+    assert fixture_doc(lambda: None) == "empty docstring"
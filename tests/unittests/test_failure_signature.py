@@ -0,0 +1,51 @@
+import pytest
+from pytest_docgen.pytest_docgen import failure_signature
+
+SIGNATURE_TESTDATA = [
+    (
+        """    def test_one(broken):
+>       assert broken.value
+E       AttributeError: <Broken object at 0x7f3a2c1d5e50> has no attribute 'value'
+
+test_module.py:12: AttributeError""",
+        [
+            "E       AttributeError: <Broken object at 0x> has no attribute 'value'",
+            "test_module.py: AttributeError",
+        ],
+    ),
+    (
+        "('test_module.py', 4, 'Skipped: not today')",
+        ["('test_module.py', 4, 'Skipped: not today')"],
+    ),
+]
+
+
+@pytest.mark.parametrize("inval,outval", SIGNATURE_TESTDATA, ids=["traceback", "not a traceback"])
+def test_failure_signature(inval, outval):
+    assert outval == failure_signature(inval)
+
+
+def test_same_cause_different_tests():
+    first = """    def test_one(self):
+>       connect()
+
+conftest.py:30: ConnectionError"""
+    second = """    def test_two(self):
+        setup()
+>       connect()
+
+conftest.py:30: ConnectionError"""
+    assert failure_signature(first) == failure_signature(second)
+
+
+def test_no_error_lines_keeps_line_number():
+    first = """    def test_one(self):
+>       connect()
+
+conftest.py:30: ConnectionError"""
+    second = """    def test_two(self):
+>       reconnect()
+
+conftest.py:41: ConnectionError"""
+    assert failure_signature(first) == ["conftest.py:30: ConnectionError"]
+    assert failure_signature(first) != failure_signature(second)
@@ -0,0 +1,119 @@
+import io
+
+import pytest
+
+from pytest_docgen.logstore import LogStoreWriter
+
+lazy_log = pytest.importorskip("pytest_docgen.sphinxext.lazy_log")
+
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace
+
+
+@pytest.fixture
+def project(tmpdir):
+    tmpdir.join("conf.py").write("extensions = ['pytest_docgen.sphinxext.lazy_log']\n")
+    store = LogStoreWriter(str(tmpdir.join("logs", "test_module.logs.gz")))
+    store.add("test_module.py__test_one", "setup", "setting up\n")
+    offset, length = store.add("test_module.py__test_one", "call", "<called>\n")
+    store.close()
+    tmpdir.join("index.rst").write(
+        "Tests\n=====\n\n"
+        ".. toctree::\n\n   sub/page\n\n"
+        ".. docgen-log:: logs/test_module.logs.gz\n"
+        "   :heading: call\n"
+        "   :offset: {}\n"
+        "   :length: {}\n".format(offset, length)
+    )
+    tmpdir.join("sub", "page.rst").write(
+        "Page\n====\n\n"
+        ".. docgen-log:: ../logs/test_module.logs.gz\n"
+        "   :heading: call\n"
+        "   :offset: {}\n"
+        "   :length: {}\n".format(offset, length),
+        ensure=True,
+    )
+    yield tmpdir, offset, length
+
+
+def build(srcdir, builder):
+    outdir = srcdir.join("_build", builder)
+    doctreedir = srcdir.join("_build", "doctrees", builder)
+    warnings = io.StringIO()
+    # Each build registers its nodes and directives afresh.
+    with docutils_namespace():
+        app = Sphinx(
+            str(srcdir),
+            str(srcdir),
+            str(outdir),
+            str(doctreedir),
+            builder,
+            status=None,
+            warning=warnings,
+        )
+        app.build()
+    return outdir, warnings.getvalue()
+
+
+@pytest.mark.parametrize(
+    "builder, pages",
+    [
+        ("html", [("index.html", ""), ("sub/page.html", "../")]),
+        ("dirhtml", [("index.html", ""), ("sub/page/index.html", "../../")]),
+        # Every document is in the one page.
+        ("singlehtml", [("index.html", "")]),
+    ],
+)
+def test_html_placeholder(project, builder, pages):
+    srcdir, offset, length = project
+    outdir, warnings = build(srcdir, builder)
+    assert warnings == ""
+
+    # A collapsed placeholder, with nothing of the log in the page itself.
+    for page, prefix in pages:
+        src = prefix + "_docgen_logs/logs/test_module.logs.gz"
+        html = outdir.join(*page.split("/")).read()
+        assert 'data-log-src="{}"'.format(src) in html
+        assert 'data-offset="{}" data-length="{}"'.format(offset, length) in html
+        assert "called" not in html
+
+    # The store and its index are copied next to the pages, to be fetched from.
+    for name in ("test_module.logs.gz", "test_module.logs.json"):
+        copy = outdir.join(lazy_log.LOG_DIR, "logs", name)
+        assert copy.read_binary() == srcdir.join("logs", name).read_binary()
+    assert outdir.join("_static", "lazy_log.js").check()
+
+
+def test_other_builders_inline_logs(project):
+    srcdir, _, _ = project
+    outdir, warnings = build(srcdir, "text")
+    assert warnings == ""
+
+    text = outdir.join("index.txt").read()
+    assert "-[ call ]-" in text
+    assert "<called>" in text
+    assert "setting up" not in text
+    assert not outdir.join(lazy_log.LOG_DIR).check()
+
+
+def test_singlehtml_nested_root(tmpdir):
+    tmpdir.join("conf.py").write(
+        "extensions = ['pytest_docgen.sphinxext.lazy_log']\nmaster_doc = 'docs/index'\n"
+    )
+    store = LogStoreWriter(str(tmpdir.join("logs", "test_module.logs.gz")))
+    offset, length = store.add("test_module.py__test_one", "call", "<called>\n")
+    store.close()
+    tmpdir.join("docs", "index.rst").write(
+        "Tests\n=====\n\n"
+        ".. docgen-log:: ../logs/test_module.logs.gz\n"
+        "   :heading: call\n"
+        "   :offset: {}\n"
+        "   :length: {}\n".format(offset, length),
+        ensure=True,
+    )
+    outdir, warnings = build(tmpdir, "singlehtml")
+    assert warnings == ""
+
+    # Relative to the one page, written where the root document is, not to its anchors.
+    html = outdir.join("docs", "index.html").read()
+    assert 'data-log-src="../_docgen_logs/logs/test_module.logs.gz"' in html
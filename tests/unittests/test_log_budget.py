@@ -0,0 +1,85 @@
+from collections import namedtuple
+
+from pytest_docgen.logstore import read_index, read_log
+from pytest_docgen.pytest_docgen import LogBudget, _head_tail
+
+TEXT = "".join("line {}\n".format(i) for i in range(10))
+
+
+Doccol = namedtuple("Doccol", "node_id log_location")
+
+
+def doccol(node_id):
+    return Doccol(node_id, "_docs/logs/test_module")
+
+
+def test_head_tail():
+    assert _head_tail(TEXT, 2) == ("line 0\nline 1\n", "line 8\nline 9\n")
+    assert _head_tail(TEXT.rstrip("\n"), 1) == ("line 0\n", "line 9")
+    # Short text isn't repeated.
+    assert _head_tail("one\ntwo\n", 5) == ("one\ntwo\n", "")
+    assert _head_tail("x" * 100, 1, max_bytes=10) == ("x" * 5, "")
+    assert _head_tail(TEXT, 2, max_bytes=0) == ("", "")
+
+
+def test_under_budget_kept():
+    budget = LogBudget(test_lines=10)
+    assert budget.trim(doccol("test_one"), "call", TEXT) == TEXT
+
+
+def test_test_lines():
+    budget = LogBudget(test_lines=10, keep_lines=2)
+    test = doccol("test_one")
+    assert budget.trim(test, "setup", "setup\n") == "setup\n"
+    trimmed = budget.trim(test, "call", TEXT)
+    assert trimmed.splitlines() == [
+        "line 0",
+        "line 1",
+        "[... 6 lines (42 bytes) of call elided ...]",
+        "line 8",
+        "line 9",
+    ]
+    # Each test has its own budget.
+    assert budget.trim(doccol("test_two"), "call", TEXT) == TEXT
+
+
+def test_session_bytes():
+    budget = LogBudget(session_bytes=100, keep_lines=1)
+    assert budget.trim(doccol("test_one"), "call", TEXT[:70]) == TEXT[:70]
+    assert budget.trim(doccol("test_two"), "call", TEXT).splitlines() == [
+        "line 0",
+        "[... 8 lines (56 bytes) of call elided ...]",
+        "line 9",
+    ]
+    assert budget.session_used == [84, 12]
+
+
+def test_one_huge_line():
+    budget = LogBudget(test_bytes=20)
+    trimmed = budget.trim(doccol("test_one"), "stdout", "x" * 1000)
+    # A line on its own is all head.
+    assert trimmed == "x" * 10 + "\n[... 1 line (990 bytes) of stdout elided ...]\n"
+
+
+def test_multibyte():
+    # Sizes are in bytes: three per character here.
+    budget = LogBudget(test_bytes=20)
+    trimmed = budget.trim(doccol("test_one"), "stdout", "\u20ac" * 1000)
+    # A character that would only partly fit is left out.
+    assert trimmed == "\u20ac" * 3 + "\n[... 1 line (2991 bytes) of stdout elided ...]\n"
+
+    budget = LogBudget(test_lines=4, keep_lines=1)
+    trimmed = budget.trim(doccol("test_one"), "call", "\u00e4\n" * 10)
+    assert trimmed == "\u00e4\n[... 8 lines (24 bytes) of call elided ...]\n\u00e4\n"
+
+
+def test_archive(tmpdir):
+    tmpdir.chdir()
+    log_location = "_docs/logs/test_module"
+    budget = LogBudget(test_lines=4, keep_lines=1, archive=True)
+    trimmed = budget.trim(doccol("test_one"), "call", TEXT)
+    assert "the whole of it is in logs/test_module.archive.gz ...]" in trimmed
+    written = budget.close()
+    store = log_location + ".archive.gz"
+    assert [filename for filename, _ in written] == [store, log_location + ".archive.json"]
+    assert read_log(store, *read_index(store)["test_one"]["call"]) == TEXT
@@ -0,0 +1,90 @@
+import io
+
+import pytest
+
+from pytest_docgen.logstore import LogStoreWriter
+
+log_include = pytest.importorskip("pytest_docgen.sphinxext.log_include")
+# The extension itself only needs docutils.
+application = pytest.importorskip("sphinx.application")
+
+from sphinx.util.docutils import docutils_namespace
+
+
+@pytest.fixture
+def project(tmpdir):
+    tmpdir.join("conf.py").write("extensions = ['pytest_docgen.sphinxext.log_include']\n")
+    store = LogStoreWriter(str(tmpdir.join("logs", "test_module.log.gz")))
+    store.add("test_module.py__test_one", "Captured Output", "<first capture>\n")
+    offset, length = store.add("test_module.py__test_two", "Captured Output", "second capture\n")
+    store.close()
+    yield tmpdir, offset, length
+
+
+def build(srcdir, text):
+    srcdir.join("index.rst").write("Tests\n=====\n\n" + text)
+    outdir = srcdir.join("_build", "text")
+    warnings = io.StringIO()
+    # Each build registers its nodes and directives afresh.
+    with docutils_namespace():
+        app = application.Sphinx(
+            str(srcdir),
+            str(srcdir),
+            str(outdir),
+            str(srcdir.join("_build", "doctrees")),
+            "text",
+            status=None,
+            warning=warnings,
+            freshenv=True,
+        )
+        app.build()
+    return outdir.join("index.txt").read(), warnings.getvalue()
+
+
+def test_offset_and_length(project):
+    srcdir, offset, length = project
+    text, warnings = build(
+        srcdir,
+        ".. docgen-log-include:: logs/test_module.log.gz\n"
+        "   :offset: {}\n"
+        "   :length: {}\n".format(offset, length),
+    )
+    assert warnings == ""
+    assert "second capture" in text
+    assert "first capture" not in text
+
+
+def test_test_lookup(project):
+    srcdir, _, _ = project
+    text, warnings = build(
+        srcdir,
+        ".. docgen-log-include:: logs/test_module.log.gz\n   :test: test_module.py__test_one\n",
+    )
+    assert warnings == ""
+    assert "<first capture>" in text
+    assert "second capture" not in text
+
+
+def test_missing_log(project):
+    srcdir, _, _ = project
+    text, warnings = build(
+        srcdir,
+        ".. docgen-log-include:: logs/test_module.log.gz\n"
+        "   :test: test_module.py__test_one\n"
+        "   :log: call\n",
+    )
+    assert "No 'call' log of test 'test_module.py__test_one' in logs/test_module.log.gz" in warnings
+    assert "first capture" not in text
+
+
+def test_corrupt_store(project):
+    srcdir, offset, length = project
+    srcdir.join("logs", "test_module.log.gz").write_binary(b"not a log store" * 10)
+    text, warnings = build(
+        srcdir,
+        ".. docgen-log-include:: logs/test_module.log.gz\n"
+        "   :offset: {}\n"
+        "   :length: {}\n".format(offset, length),
+    )
+    assert "Could not read the log from logs/test_module.log.gz" in warnings
+    assert "capture" not in text
@@ -0,0 +1,61 @@
+import gzip
+
+from pytest_docgen.logstore import LogStoreWriter, read_index, read_log
+from pytest_docgen.pytest_docgen import CaptureReader
+
+
+def test_logs_read_back_on_their_own(tmpdir):
+    filename = str(tmpdir.join("logs", "test_module.logs.gz"))
+    store = LogStoreWriter(filename)
+    first = store.add("test_module.py__test_one", "call", "first log\n")
+    second = store.add("test_module.py__test_two", "Captured Output", "second\nlog\n")
+    written = store.close()
+    assert [name for name, _ in written] == [
+        filename,
+        str(tmpdir.join("logs", "test_module.logs.json")),
+    ]
+    assert store.close() == []
+
+    assert read_log(filename, *first) == "first log\n"
+    assert read_log(filename, *second) == "second\nlog\n"
+    assert read_index(filename) == {
+        "test_module.py__test_one": {"call": list(first)},
+        "test_module.py__test_two": {"Captured Output": list(second)},
+    }
+    # The store as a whole is still a gzip file, of every log.
+    with gzip.open(filename, "rt") as f:
+        assert f.read() == "first log\nsecond\nlog\n"
+
+
+def test_same_logs_same_store(tmpdir):
+    digests = []
+    for name in ("a.logs.gz", "b.logs.gz"):
+        store = LogStoreWriter(str(tmpdir.join(name)))
+        store.add("test_module.py__test_one", "call", "log")
+        digests.append(store.close()[0][1])
+    assert digests[0] == digests[1]
+
+
+def test_capture_reader_lines(tmpdir):
+    log = tmpdir.join("test_module.log")
+    log.write("one\ntwo\nthree\n")
+    reader = CaptureReader(str(log))
+    assert reader.lines(2, 3) == "two\nthree\n"
+    assert reader.lines(1, 1) == "one\n"
+    # Past the end of the file, as literalinclude would just stop.
+    assert reader.lines(3, 10) == "three\n"
+
+
+def test_append(tmpdir):
+    filename = str(tmpdir.join("test_module.log.gz"))
+    store = LogStoreWriter(filename)
+    first = store.add("test_one", "Captured Output", "first\n")
+    store.close()
+    store = LogStoreWriter(filename, append=True)
+    second = store.add("test_two", "Captured Output", "second\n")
+    store.close()
+
+    assert second[0] == first[1]
+    assert read_log(filename, *first) == "first\n"
+    assert read_log(filename, *second) == "second\n"
+    assert sorted(read_index(filename)) == ["test_one", "test_two"]
@@ -0,0 +1,59 @@
+import io
+
+import pytest
+from tabulate import tabulate
+
+from pytest_docgen.pytest_docgen import RESULTS_HEADER, write_overview_table
+
+RESULTS = [
+    {"name": ":ref:`test_one <test_mod-test_one>`", "setup": "|passed|", "call": "|passed|"},
+    {"name": ":ref:`test_two <test_mod-test_two>`", "setup": "|failed|"},
+    {"name": 'say "hi"', "setup": "|passed|", "call": "|failed|", "teardown": "|passed|"},
+    {"name": "test_grüße[\x1b[31mred\x1b[0m]", "setup": "|passed|", "call": "|passed|"},
+]
+
+
+def render(results, fmt):
+    f = io.StringIO()
+    write_overview_table(f, results, fmt)
+    return f.getvalue()
+
+
+@pytest.mark.parametrize("results", [RESULTS, []], ids=["results", "no results"])
+def test_simple_same_as_tabulate(results):
+    rows = [
+        (x["name"], x["setup"], x.get("call", "NOTRUN"), x.get("teardown", "NOTRUN"))
+        for x in results
+    ]
+    expected = tabulate(rows, headers=RESULTS_HEADER, tablefmt="rst")
+    assert render(results, "simple") == expected + "\n"
+
+
+def test_list_table():
+    lines = render(RESULTS, "list-table").splitlines()
+    assert lines[:6] == [
+        ".. list-table::",
+        "   :header-rows: 1",
+        "",
+        "   * - Test Name",
+        "     - Setup",
+        "     - Call",
+    ]
+    assert lines[-8:-4] == [
+        '   * - say "hi"',
+        "     - |passed|",
+        "     - |failed|",
+        "     - |passed|",
+    ]
+
+
+def test_csv_table():
+    assert render(RESULTS, "csv-table").splitlines() == [
+        ".. csv-table::",
+        '   :header: "Test Name", "Setup", "Call", "Teardown"',
+        "",
+        '   ":ref:`test_one <test_mod-test_one>`", "|passed|", "|passed|", "NOTRUN"',
+        '   ":ref:`test_two <test_mod-test_two>`", "|failed|", "NOTRUN", "NOTRUN"',
+        '   "say ""hi""", "|passed|", "|failed|", "|passed|"',
+        '   "test_grüße[\x1b[31mred\x1b[0m]", "|passed|", "|passed|", "NOTRUN"',
+    ]
@@ -0,0 +1,36 @@
+from pytest_docgen.pytest_docgen import JsonlResultStore, SqliteResultStore
+
+
+def record(index):
+    return {
+        "test": {
+            "nodeid": "test_module.py::test_{}".format(index),
+            "stages": [["setup", "passed", 0.0], ["call", "passed", 0.1]],
+        }
+    }
+
+
+def test_sqlite_commits_in_batches(tmpdir, monkeypatch):
+    monkeypatch.setattr(SqliteResultStore, "COMMIT_EVERY", 2)
+    filename = str(tmpdir.join("results.sqlite"))
+    store = SqliteResultStore(filename, "run")
+    for index in range(3):
+        store.append(record(index))
+
+    # The first batch can already be read, before the store is closed.
+    assert SqliteResultStore.read_run_id(filename) == "run"
+    assert len(list(SqliteResultStore.read(filename))) == 2
+    store.close()
+    assert list(SqliteResultStore.read(filename)) == [record(index) for index in range(3)]
+
+
+def test_jsonl_flushes_each_record(tmpdir):
+    filename = str(tmpdir.join("results.jsonl"))
+    store = JsonlResultStore(filename, "run")
+    for index in range(3):
+        store.append(record(index))
+
+    # Every record can already be read, before the store is closed.
+    assert JsonlResultStore.read_run_id(filename) == "run"
+    assert list(JsonlResultStore.read(filename)) == [record(index) for index in range(3)]
+    store.close()
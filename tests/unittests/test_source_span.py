@@ -0,0 +1,64 @@
+import pytest
+
+from pytest_docgen.pytest_docgen import source_lines, source_span
+
+SOURCE = '''import pytest
+
+
+@pytest.mark.parametrize("value", [1, 2])
+def test_one(value):
+    """
+    Docs.
+    """
+    assert value
+
+
+class TestClass:
+    def test_two(self):
+        pass
+
+    # A comment after the body.
+
+
+def test_three():
+    check(
+        1,
+    )
+    text = """
+# Not a comment.
+"""
+# A comment after the body.
+x = 1'''
+
+
+@pytest.fixture
+def source_file(tmpdir):
+    source = tmpdir.join("test_source.py")
+    source.write(SOURCE)
+    yield str(source)
+
+
+@pytest.mark.parametrize(
+    "name,span",
+    [
+        ("test_one", (4, 9)),
+        ("TestClass", (12, 14)),
+        ("TestClass.test_two", (13, 14)),
+        ("test_three", (19, 25)),
+    ],
+    ids=["decorated function", "class", "method", "multi-line statements"],
+)
+def test_source_span(source_file, name, span):
+    assert source_span(source_file, name) == span
+
+
+def test_source_span_not_found(source_file, tmpdir):
+    assert source_span(source_file, "test_two") is None
+    assert source_span(str(tmpdir.join("missing.py")), "test_one") is None
+
+
+def test_source_lines(source_file):
+    assert source_lines(source_file, source_span(source_file, "TestClass.test_two")) == [
+        "    def test_two(self):",
+        "        pass",
+    ]